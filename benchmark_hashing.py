@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import argparse
+
+from utils.files import LocalFileBackend
+from utils.hash_file import hash_file
+from utils.local_engine import (
+    LocalHashingEngine,
+    ENGINE_MODES,
+    CACHE_MODES,
+    cached_bytes,
+    evict_from_page_cache,
+)
+
+def collect_files(root):
+    files = [path for path in LocalFileBackend().list_files(root) if os.path.isfile(path)]
+    return files, sum(os.path.getsize(path) for path in files)
+
+def tree_cached_bytes(files):
+    """Bytes of the tree in the page cache, or None if it cannot be measured."""
+    total = 0
+    for path in files:
+        cached = cached_bytes(path)
+        if cached is None:
+            return None
+        total += cached
+    return total
+
+def run_backend(files, algorithm):
+    backend = LocalFileBackend()
+    for path in files:
+        hash_file(backend, path, algorithm)
+
+def run_engine(files, algorithm, mode, workers, cache_mode):
+    with LocalHashingEngine(algorithm, mode, workers, cache_mode=cache_mode) as engine:
+        for _ in engine.hash_files(files):
+            pass
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare local hashing throughput per engine mode")
+    parser.add_argument("root", help="Directory to hash")
+    parser.add_argument("--algorithm", default="sha256", help="Hash algorithm (default: sha256)")
+    parser.add_argument("--workers", type=int, default=None, help="Pool size (default: CPU count)")
+    parser.add_argument(
+        "--modes",
+        default="backend," + ",".join(ENGINE_MODES),
+        help="Comma separated modes to run: backend, serial, thread, process",
+    )
+    parser.add_argument(
+        "--cache-mode",
+        choices=CACHE_MODES,
+        default="normal",
+        help="Engine read mode: normal, fadvise (drop pages after hashing) or direct (O_DIRECT)",
+    )
+    parser.add_argument(
+        "--cold",
+        action="store_true",
+        help="Evict the tree from the page cache before each mode so runs read from disk",
+    )
+    args = parser.parse_args(argv)
+
+    files, total_bytes = collect_files(args.root)
+    if not files:
+        print(f"No files under {args.root}")
+        sys.exit(1)
+    print(f"{len(files)} files, {total_bytes / 1e6:.1f} MB, algorithm {args.algorithm}, "
+          f"cache mode {args.cache_mode}")
+
+    for mode in args.modes.split(","):
+        if args.cold:
+            for path in files:
+                evict_from_page_cache(path)
+        cached_before = tree_cached_bytes(files)
+        start = time.perf_counter()
+        if mode == "backend":
+            run_backend(files, args.algorithm)
+        else:
+            run_engine(files, args.algorithm, mode, args.workers, args.cache_mode)
+        elapsed = time.perf_counter() - start
+        line = f"{mode:>8}: {elapsed:8.2f} s  {total_bytes / 1e6 / elapsed:10.1f} MB/s"
+        cached_after = tree_cached_bytes(files)
+        if cached_before is not None and cached_after is not None:
+            # page-cache impact of the pass: how much of the tree it left behind
+            line += f"  page cache {cached_before / 1e6:.1f} -> {cached_after / 1e6:.1f} MB"
+        print(line)
+
+if __name__ == "__main__":
+    main()
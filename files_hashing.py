@@ -1,24 +1,44 @@
 # files_hashing.py
 from __future__ import annotations
 
+import os
 import time
 import socket
 import argparse
 import logging
+import threading
+import multiprocessing
 
 
-from typing import Callable, Iterable, List, Optional, Tuple
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
 from utils.database import (
     create_database,
     save_hashes_to_db,
+    save_link_hashes,
     get_file_info_from_db,
+    get_files_under,
     delete_file_from_db,
-    set_meta
+    set_meta,
+    get_meta,
+    enqueue_jobs,
+    claim_jobs,
+    renew_leases,
+    complete_jobs,
+    fail_jobs,
+    release_jobs,
+    reclaim_expired_leases,
+    count_jobs,
+    prune_jobs,
+    compact_journal,
 )
 from utils.config import Config
-from utils.files import FileBackend, SFTPFileBackend
-from utils.hash_file import hash_file  # returns (digest, error)
+from utils.files import FileBackend, LocalFileBackend, make_backend
+from utils.hash_file import hash_file, resolve_stored_algorithm  # hash_file returns (digest, error)
+from utils.local_engine import make_engine, hash_local_file
+from utils.dir_index import DirectoryIndex
+from utils.progress import ProgressTracker, log_sink, meta_sink
+from utils.scheduler import WorkItem, make_scheduler
 
 # Import Paramiko-derived exceptions if available; otherwise – stubs for typing/checks.
 try:
@@ -37,7 +57,7 @@ class FileHashingService:
         self,
         config: Config,
         *,
-        backend_factory: Callable[[Config], FileBackend] = SFTPFileBackend,
+        backend_factory: Callable[[Config], FileBackend] = make_backend,
         sleep_fn: Callable[[float], None] = time.sleep,
     ) -> None:
         self.config = config
@@ -47,10 +67,36 @@ class FileHashingService:
         # read from config with defaults
         self.sleep_after_pass_s = int(self.config.get("SLEEP_AFTER_PASS", 10 * 60))
         self.retry_sleep_s = int(self.config.get("RETRY_SLEEP", 10 * 60))
+        # coordinator/worker mode
+        self.lease_s = float(self.config.get("LEASE_SECONDS", 10 * 60))
+        self.job_batch = int(self.config.get("JOB_BATCH", 32))
+        self.worker_poll_s = float(self.config.get("WORKER_POLL", 5))
+        self.max_attempts = int(self.config.get("MAX_ATTEMPTS", 3))
+        # incremental rescans: 1 lists the whole tree on every pass
+        self.full_verify_every = max(1, int(self.config.get("FULL_VERIFY_EVERY", 6)))
+        self.journal_max_rows = int(self.config.get("JOURNAL_MAX_ROWS", 1_000_000))
 
         self.db_path = config.get("DB_PATH", "file_hashes.db")
         create_database(self.db_path)
 
+        # HASH_ALGORITHM "auto" benchmarks the registered hashers once per database;
+        # the algorithm is stored with every row, so mixed databases stay readable
+        self.algorithm = resolve_stored_algorithm(self.config, self.db_path)
+        logger.info("Hashing with %s", self.algorithm)
+
+        # HASH_ENGINE: "backend" (default) reads through the backend; "serial", "thread"
+        # or "process" use the local engine when BACKEND is "local"
+        self.engine = make_engine(self.config, self.algorithm)
+        self.engine_batch = int(self.config.get("ENGINE_BATCH", 1024))
+
+        # counters are bumped per file; the log and the meta table (stats.py)
+        # get a snapshot every PROGRESS_INTERVAL seconds
+        self.progress = ProgressTracker(
+            float(self.config.get("PROGRESS_INTERVAL", 30)), sinks=[log_sink(logger)]
+        )
+        self._progress_meta = None
+        self._throughput: Optional[float] = None  # bytes/s observed in the last pass
+
     # ---------- Public methods ----------
 
     def run_forever(self) -> None:
@@ -64,83 +110,381 @@ class FileHashingService:
         One full run: collect the list of files, calculate hashes, and save them to the database.
         If the connection is lost during the run — sleep for 10 minutes and then RETRY the entire run from the beginning
         """
-        while True:  # connection retry loop
-            backend: Optional[FileBackend] = None
-            try:
-                backend = self.backend_factory(self.config)
-                self._process_all_files(backend)
-                return  # successfully finished the run — exit retries
-            except Exception as e:
-                if self._is_connection_error(e):
-                    self._sleep_retry()
-                    continue  # try again with a new connection
-                raise  # other errors are raised up (non-network)
-            finally:
-                if backend is not None:
-                    try:
-                        backend.close()
-                    except Exception:
-                        pass
-
-    # ---------- Internal logic ----------
+        self._start_progress()
+        try:
+            while True:  # connection retry loop
+                backend: Optional[FileBackend] = None
+                try:
+                    backend = self.backend_factory(self.config)
+                    self._process_all_files(backend)
+                    return  # successfully finished the run — exit retries
+                except Exception as e:
+                    if self._is_fatal_error(backend, e):
+                        self._sleep_retry()
+                        continue  # try again with a new connection
+                    raise  # other errors are raised up (non-network)
+                finally:
+                    if backend is not None:
+                        try:
+                            backend.close()
+                        except Exception:
+                            pass
+        finally:
+            self.progress.stop()
+
+    def run_coordinator(self, once: bool = False) -> None:
+        """
+        Coordinator mode: queue one directory job per root, then wait for the workers
+        to drain the job table. Leases of dead workers are handed back to the queue.
+        """
+        while True:
+            self.enqueue_pass()
+            self.wait_for_jobs()
+            if once:
+                return
+            self._sleep_after_pass()
 
-    def _process_all_files(self, backend: FileBackend) -> None:
+    def enqueue_pass(self) -> None:
         remote_roots = self.config.get("PATHS", [])
         if not remote_roots:
-            logger.warning("PATHS is empty in %s – no files will be processed", self.config.path)
+            logger.warning("PATHS is empty in %s – no files will be processed", self.config.get_config_path())
             return
-        all_files = self._collect_files(backend, remote_roots)
-        total = len(all_files)
+        # jobs of earlier passes would otherwise pile up, including files that no longer exist
+        prune_jobs(self.db_path)
+        enqueue_jobs([(root, "dir") for root in remote_roots], self.db_path)
+        logger.info("Queued %d root directories for the workers.", len(remote_roots))
 
-        # Persist the latest discovery snapshot in the DB
-        set_meta(self.db_path, "total_files", str(total))
+    def wait_for_jobs(self) -> None:
+        """Block until no job is pending or leased."""
+        while True:
+            reclaimed = reclaim_expired_leases(self.db_path)
+            if reclaimed:
+                logger.warning("Reclaimed %d expired leases.", reclaimed)
+            counts = count_jobs(self.db_path)
+            if not counts.get("pending") and not counts.get("leased"):
+                set_meta(self.db_path, "total_files", str(sum(count_jobs(self.db_path, "file").values())))
+                compact_journal(self.db_path, self.journal_max_rows)
+                logger.info("Pass finished: %s", counts)
+                return
+            self.sleep(self.worker_poll_s)
+
+    def run_worker(self, worker_id: Optional[str] = None, *, exit_when_idle: bool = False) -> None:
+        """
+        Worker mode: lease jobs from the shared table, hash, and report back.
+        On a connection drop the leases are released and the worker reconnects.
+        """
+        if worker_id is None:
+            worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._start_progress(f"progress:{worker_id}")
+        try:
+            while True:
+                backend: Optional[FileBackend] = None
+                try:
+                    backend = self.backend_factory(self.config)
+                    if self._work_jobs(backend, worker_id, exit_when_idle):
+                        return
+                except Exception as e:
+                    if self._is_fatal_error(backend, e):
+                        self._sleep_retry()
+                        continue
+                    raise
+                finally:
+                    if backend is not None:
+                        try:
+                            backend.close()
+                        except Exception:
+                            pass
+        finally:
+            self.progress.stop()
+
+    # ---------- Internal logic ----------
 
-        logger.info("Found %d files to process (saved to DB meta).", total)
+    def _work_jobs(self, backend: FileBackend, worker_id: str, exit_when_idle: bool) -> bool:
+        """Process leased jobs until idle. Returns True when the worker should exit."""
+        while True:
+            jobs = claim_jobs(self.db_path, worker_id, self.job_batch, self.lease_s)
+            if not jobs:
+                counts = count_jobs(self.db_path)
+                if exit_when_idle and not counts.get("pending") and not counts.get("leased"):
+                    return True
+                self.sleep(self.worker_poll_s)
+                continue
 
-        for file_path in all_files:   
+            pending = [path for path, _, _ in jobs]
+            self.progress.add(total=sum(1 for _, kind, _ in jobs if kind == "file"))
+            # keep the whole batch leased while it is worked through, however long one job takes
+            stop = threading.Event()
+            heartbeat = threading.Thread(
+                target=self._renew_leases_until, args=(worker_id, pending, stop), daemon=True
+            )
+            heartbeat.start()
+            try:
+                for path, kind, attempts in jobs:
+                    try:
+                        err = self._run_job(backend, path, kind)
+                    except Exception as e:
+                        # a dropped connection is retried after reconnecting; a job that keeps
+                        # dropping it, or fails for any other reason, is marked failed
+                        if self._is_fatal_error(backend, e) and attempts < self.max_attempts:
+                            raise
+                        logger.warning("Job %s (%s) failed: %s", path, kind, e)
+                        err = str(e)
+                    if err is None:
+                        complete_jobs(self.db_path, worker_id, [path])
+                    else:
+                        fail_jobs(self.db_path, worker_id, [(path, err)])
+                    pending.remove(path)
+            finally:
+                stop.set()
+                heartbeat.join()
+                if pending:
+                    release_jobs(self.db_path, worker_id, pending)
+
+    def _renew_leases_until(self, worker_id: str, pending: List[str], stop: threading.Event) -> None:
+        """Lease heartbeat: renew the jobs still in `pending` every LEASE_SECONDS / 3 until `stop`."""
+        while not stop.wait(self.lease_s / 3):
             try:
-                size, mtime = backend.stat(file_path)
-                if size == 0:
-                    continue  # skip empty files
-
-                db_info = get_file_info_from_db(self.db_path, file_path)
-                if db_info:
-                    db_hash, db_size, db_mtime = db_info
-                    if db_size == size and db_mtime == mtime:
-                        continue  # already relevant hash in DB — skip
-
-                digest, err = hash_file(backend, file_path, "sha256")
-                if err is not None:
-                    # If this looks like a connection drop — raise an exception and reconnect
-                    possible_exc = self._string_to_exception(err)
-                    if self._is_connection_error(possible_exc):
-                        raise possible_exc
-                    # Otherwise — just skip the file
-                    continue
-
-                save_hashes_to_db([(file_path, digest, size, mtime)], self.db_path)
+                renew_leases(self.db_path, worker_id, list(pending), self.lease_s)
+            except Exception:
+                logger.exception("Could not renew the leases of %s", worker_id)
+
+    def _run_job(self, backend: FileBackend, path: str, kind: str) -> Optional[str]:
+        if kind == "dir":
+            # directory job: queue its files as file jobs and its subdirectories as
+            # dir jobs, so discovery of a large tree spreads across the workers
+            try:
+                subdirs, names = backend.list_dir(path)
+            except FileNotFoundError:
+                # gone since it was queued: forget everything stored under it
+                delete_file_from_db(get_files_under(self.db_path, backend.join(path, "")), self.db_path)
+                return None
+            enqueue_jobs(
+                [(backend.join(path, name), "file") for name in names]
+                + [(backend.join(path, name), "dir") for name in subdirs],
+                self.db_path,
+            )
+            return None
+        return self._process_file(backend, path)
 
+
+    def _process_all_files(self, backend: FileBackend) -> None:
+        remote_roots = self.config.get("PATHS", [])
+        if not remote_roots:
+            logger.warning("PATHS is empty in %s – no files will be processed", self.config.get_config_path())
+            return
+        # only every FULL_VERIFY_EVERY-th pass lists every directory; the others
+        # list just the directories whose mtime changed. The pass count is kept in
+        # meta, so --once runs from cron and restarts keep the rhythm
+        passes = int(get_meta(self.db_path, "scan_passes", 0))
+        full = passes % self.full_verify_every == 0
+        index = DirectoryIndex(backend, self.db_path)
+        all_files, links = self._collect_files(backend, remote_roots, index, full)
+        total = len(all_files) + sum(len(aliases) for aliases in links.values())
+
+        self.progress.reset(total=total)
+        if full:
+            # Persist the latest discovery snapshot in the DB
+            set_meta(self.db_path, "total_files", str(total))
+            logger.info("Found %d files to process (saved to DB meta).", total)
+        else:
+            logger.info("Incremental pass: %d files in changed directories.", total)
+
+        # stat everything first, then hash in priority order (utils/scheduler.py)
+        items = self._classify_files(backend, all_files)
+        regular, large = make_scheduler(self.config, self._throughput).plan(items)
+        logger.info("%d files to hash, %d of them in the large-file lane.", len(regular) + len(large), len(large))
+
+        if self._uses_engine(backend) and self.engine.mode != "serial":
+            self._hash_lanes_with_engine(regular, large)
+        else:
+            # a single connection: the large-file lane runs after the regular one
+            for item in regular + large:
+                self._process_item(backend, item)
+
+        # hard links share the inode, so they share the digest of the path that was hashed
+        if links:
+            save_link_hashes(links, self.db_path)
+            self.progress.add(processed=sum(len(aliases) for aliases in links.values()))
+        index.commit()
+        set_meta(self.db_path, "scan_passes", str(passes + 1))
+        compact_journal(self.db_path, self.journal_max_rows)
+
+        snap = self.progress.snapshot()
+        if snap["bytes"]:
+            self._throughput = snap["bytes_per_s"]  # feeds shortest_expected next pass
+
+    def _classify_files(self, backend: FileBackend, all_files: List[str]) -> List[WorkItem]:
+        """Stat every file and return the ones that are new or changed."""
+        items: List[WorkItem] = []
+        for file_path in all_files:
+            try:
+                item = self._needs_hash(backend, file_path)
             except FileNotFoundError:
                 delete_file_from_db([file_path], self.db_path)
+                self.progress.add(processed=1)
+                continue
             except Exception as e:
-                # If the connection drops during the run — we’ll restore it for an external retry
-                if self._is_connection_error(e):
+                if self._is_fatal_error(backend, e):
                     raise
-                # Any other errors with the file — skip the file
+                self.progress.add(processed=1, errors=1)
                 continue
+            if item is None:
+                self.progress.add(processed=1)
+            else:
+                items.append(item)
+        return items
+
+    def _hash_lanes_with_engine(self, regular: List[WorkItem], large: List[WorkItem]) -> None:
+        """
+        Local fast path: the regular lane is hashed in batches on the engine's pool, one DB
+        write per batch, while a dedicated thread works through the large-file lane.
+        """
+        lane_errors: List[BaseException] = []
 
-    def _collect_files(self, backend: FileBackend, roots: Iterable[str]) -> List[str]:
+        def run_large_lane() -> None:
+            try:
+                for item in large:
+                    digest, err = self.engine.hash_file(item.path)
+                    self._save_engine_results([item], [(item.path, digest, err)])
+            except BaseException as e:
+                lane_errors.append(e)
+
+        lane = threading.Thread(target=run_large_lane, daemon=True)
+        lane.start()
+        try:
+            for start in range(0, len(regular), self.engine_batch):
+                batch = regular[start:start + self.engine_batch]
+                self._save_engine_results(batch, self.engine.hash_files([item.path for item in batch]))
+        finally:
+            lane.join()
+        if lane_errors:
+            raise lane_errors[0]
+
+    def _save_engine_results(self, items: List[WorkItem], results: Iterable[Tuple[str, Optional[str], Optional[str]]]) -> None:
+        rows = []
+        for item, (_, digest, err) in zip(items, results):
+            if err is None:
+                rows.append((item.path, digest, item.size, item.mtime, self.algorithm))
+                self.progress.add(processed=1, hashed=1, bytes=item.size)
+            else:
+                self.progress.add(processed=1, errors=1)
+        if rows:
+            save_hashes_to_db(rows, self.db_path)
+
+    def _needs_hash(self, backend: FileBackend, file_path: str) -> Optional[WorkItem]:
+        """A WorkItem if the file is new or changed, None if it can be skipped."""
+        size, mtime = backend.stat(file_path)
+        if size == 0:
+            return None  # skip empty files
+
+        db_info = get_file_info_from_db(self.db_path, file_path)
+        if db_info:
+            _, _, db_size, db_mtime, _ = db_info
+            if db_size == size and db_mtime == mtime:
+                return None  # already relevant hash in DB — skip
+            return WorkItem(file_path, size, mtime, "changed")
+        return WorkItem(file_path, size, mtime, "new")
+
+    def _uses_engine(self, backend: FileBackend) -> bool:
+        return self.engine is not None and isinstance(backend, LocalFileBackend)
+
+    def _process_file(self, backend: FileBackend, file_path: str) -> Optional[str]:
+        """
+        Hash one file if it is new or changed and store the result.
+        Connection errors are raised; any other problem is returned as an error string.
+        """
+        try:
+            item = self._needs_hash(backend, file_path)
+        except FileNotFoundError:
+            delete_file_from_db([file_path], self.db_path)
+            self.progress.add(processed=1)
+            return None
+        except Exception as e:
+            if self._is_fatal_error(backend, e):
+                raise
+            self.progress.add(processed=1, errors=1)
+            return str(e)
+        if item is None:
+            self.progress.add(processed=1)
+            return None
+        return self._process_item(backend, item)
+
+    def _process_item(self, backend: FileBackend, item: WorkItem) -> Optional[str]:
+        """
+        Hash a file that is known to be new or changed and store the result.
+        Connection errors are raised; any other problem is returned as an error string.
+        """
+        try:
+            if self._uses_engine(backend):
+                digest, err = self.engine.hash_file(item.path)
+            elif isinstance(backend, LocalFileBackend):
+                # reused buffer and sparse-aware reads even without an engine
+                digest, err = hash_local_file(item.path, self.algorithm)
+            else:
+                digest, err = hash_file(backend, item.path, self.algorithm)
+            if err is not None:
+                # If this looks like a connection drop — raise an exception and reconnect
+                possible_exc = self._string_to_exception(err)
+                if self._is_fatal_error(backend, possible_exc):
+                    raise possible_exc
+                # Otherwise — just skip the file
+                self.progress.add(processed=1, errors=1)
+                return err
+
+            save_hashes_to_db([(item.path, digest, item.size, item.mtime, self.algorithm)], self.db_path)
+            self.progress.add(processed=1, hashed=1, bytes=item.size)
+            return None
+
+        except FileNotFoundError:
+            delete_file_from_db([item.path], self.db_path)
+            self.progress.add(processed=1)
+            return None
+        except Exception as e:
+            # If the connection drops during the run — we’ll restore it for an external retry
+            if self._is_fatal_error(backend, e):
+                raise
+            # Any other errors with the file — skip the file
+            self.progress.add(processed=1, errors=1)
+            return str(e)
+
+    def _collect_files(
+        self, backend: FileBackend, roots: Iterable[str], index: DirectoryIndex, full: bool
+    ) -> Tuple[List[str], Dict[str, List[str]]]:
+        """
+        Files to check under `roots`, plus {hashed path: other hard links} for local trees.
+        Files that disappeared since the last scan are removed from the DB.
+        """
         files: List[str] = []
+        links: Dict[str, List[str]] = {}
         for root in roots:
-            # backend.list_files recursively lists all files under root
-            files.extend(list(backend.list_files(root)))
-        return files
+            found, removed = index.scan(root, full=full)
+            if removed:
+                delete_file_from_db(removed, self.db_path)
+            if isinstance(backend, LocalFileBackend):
+                # one path per inode; the other links reuse its digest
+                for path, aliases in backend.group_by_inode(found):
+                    files.append(path)
+                    if aliases:
+                        links[path] = aliases
+            else:
+                files.extend(found)
+        return files, links
 
     # ---------- Utilities/hooks for checks and timings ----------
 
+    def _start_progress(self, meta_key: str = "progress") -> None:
+        if self._progress_meta is None:
+            self._progress_meta = meta_sink(self.db_path, meta_key)
+            self.progress.add_sink(self._progress_meta)
+        self.progress.start()
+
     def _is_connection_error(self, exc: BaseException) -> bool:
         return isinstance(exc, (OSError, socket.error, SSHException, NoValidConnectionsError))
 
+    def _is_fatal_error(self, backend: Optional[FileBackend], exc: BaseException) -> bool:
+        # a local backend has no connection to lose: its OSErrors only concern one file
+        return not isinstance(backend, LocalFileBackend) and self._is_connection_error(exc)
+
     def _string_to_exception(self, msg: str) -> Exception:
         # Converting a string error description (from hash_file) into an Exception for uniform checking
         return OSError(msg)
@@ -152,8 +496,29 @@ class FileHashingService:
     def _sleep_after_pass(self) -> None:
         # Sleep after a SUCCESSFUL pass
         self.sleep(self.sleep_after_pass_s)
-        
-        
+
+
+
+def _worker_main(config: Config, worker_id: str, exit_when_idle: bool) -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+    )
+    FileHashingService(config).run_worker(worker_id, exit_when_idle=exit_when_idle)
+
+
+def run_local_workers(config: Config, count: int, *, exit_when_idle: bool = False) -> None:
+    """Run `count` worker processes on this node against the shared DB."""
+    processes = []
+    for n in range(count):
+        worker_id = f"{socket.gethostname()}:{os.getpid()}:{n}"
+        p = multiprocessing.Process(target=_worker_main, args=(config, worker_id, exit_when_idle))
+        p.start()
+        processes.append(p)
+    for p in processes:
+        p.join()
+
+
 def main() -> None:
     
     logging.basicConfig(
@@ -173,6 +538,19 @@ def main() -> None:
         action="store_true",
         help="Run a single pass and exit (useful for tests/cron).",
     )
+    parser.add_argument(
+        "--role",
+        choices=("standalone", "coordinator", "worker"),
+        default="standalone",
+        help="standalone: list and hash in one process; coordinator: queue jobs in the DB; "
+             "worker: lease jobs from the DB and hash them (default: standalone).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of local worker processes to start with --role worker (default: 1).",
+    )
     args = parser.parse_args()
 
     config = Config(args.config)
@@ -187,7 +565,14 @@ def main() -> None:
         ]
     )
 
-    if args.once:
+    if args.role == "coordinator":
+        service.run_coordinator(once=args.once)
+    elif args.role == "worker":
+        if args.workers > 1:
+            run_local_workers(config, args.workers, exit_when_idle=args.once)
+        else:
+            service.run_worker(exit_when_idle=args.once)
+    elif args.once:
         service.run_once()
     else:
         service.run_forever()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+import sys
+import json
+import argparse
+
+from utils.database import get_changes_since, get_journal_bounds, compact_journal
+
+FIELDS = ("seq", "path", "op", "hash", "size", "last_modified", "algorithm", "ts")
+
+def print_changes(db_path: str, since: int, limit: int) -> int:
+    """Print changes after `since` as JSON lines; returns the last sequence number printed."""
+    first, _ = get_journal_bounds(db_path)
+    if first is not None and since < first - 1:
+        print(f"warning: entries {since + 1}..{first - 1} were compacted away, "
+              f"resynchronise from file_hashes", file=sys.stderr)
+    last = since
+    for row in get_changes_since(db_path, since, limit):
+        print(json.dumps(dict(zip(FIELDS, row))))
+        last = row[0]
+    return last
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read or compact the file_hashes change journal")
+    parser.add_argument(
+        "db_path",
+        metavar="DB_PATH",
+        help="Path to the SQLite database file (e.g. file_hashes.db)"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    since = sub.add_parser("since", help="Print changes after a sequence number as JSON lines")
+    since.add_argument("seq", type=int, help="Last sequence number already consumed (0 for all)")
+    since.add_argument("--limit", type=int, default=1000, help="Maximum entries to print (default: 1000)")
+
+    sub.add_parser("bounds", help="Print the first and last sequence numbers in the journal")
+
+    compact = sub.add_parser("compact", help="Drop superseded and old entries")
+    compact.add_argument("--max-rows", type=int, default=1_000_000, help="Entries to keep (default: 1000000)")
+
+    args = parser.parse_args(argv)
+    if args.command == "since":
+        print_changes(args.db_path, args.seq, args.limit)
+    elif args.command == "bounds":
+        first, last = get_journal_bounds(args.db_path)
+        print(json.dumps({"first": first, "last": last}))
+    else:
+        removed = compact_journal(args.db_path, args.max_rows)
+        print(f"Removed {removed} journal entries")
+
+if __name__ == "__main__":
+    main()
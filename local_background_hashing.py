@@ -1,119 +1,237 @@
 import os
-import gc
+import logging
 import threading
 import time
+from queue import Queue
 from tqdm import tqdm
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from pystray import Icon, Menu, MenuItem
 from PIL import Image, ImageDraw
-from utils.database import create_database, save_hashes_to_db, save_zero_size_files, save_error_files, get_file_info_from_db, delete_nonexistent_files
-from utils.hashing import hash_file
+from utils.database import create_database, get_meta, set_meta, save_hashes_to_db, save_zero_size_files, save_error_files, get_file_info_from_db, get_all_files_from_db, delete_file_from_db, save_link_hashes, compact_journal
+from utils.files import LocalFileBackend
+from utils.local_engine import LocalHashingEngine
+from utils.hash_file import resolve_stored_algorithm
+from utils.event_queue import DebouncedEventQueue
+from utils.event_handler import QueueingEventHandler, handle_ready_events
+from utils.dir_index import DirectoryIndex
+from utils.progress import ProgressTracker, tray_sink, tqdm_sink, meta_sink
+from utils.scheduler import Scheduler, WorkItem
 
 DB_PATH = 'file_hashes.db'
 WATCH_PATH = 'E:\\'  # Specify the root directory to watch
 BATCH_SIZE = 8192
+HASH_ALGORITHM = 'auto'  # or any name from utils/hash_file.py; 'auto' benchmarks once per database
+HASH_SECURITY = 'crypto'  # 'none' lets 'auto' pick non-cryptographic hashers such as xxh3_64
+HASH_ENGINE = 'thread'  # 'serial', 'thread' or 'process'
+HASH_WORKERS = None  # defaults to the number of CPUs
+CACHE_MODE = 'normal'  # 'fadvise' or 'direct' keep full scans out of the page cache
+EVENT_QUIET_PERIOD = 2.0  # seconds a path must be quiet before its events are handled
+FULL_VERIFY_EVERY = 720  # every Nth scan lists the whole tree (hourly at one scan per 5 s)
+JOURNAL_MAX_ROWS = 1000000  # change journal entries kept for downstream consumers
+PROGRESS_INTERVAL = 1.0  # seconds between tray/tqdm/meta progress updates
+SCHEDULE_POLICIES = ('changed_first', 'shortest_expected')  # see utils/scheduler.py
+LARGE_FILE_THRESHOLD = 1024 ** 3  # files this big are hashed on their own lane, beside the batches
+SAVE_GROUP = 64  # hashed files per DB write, so fresh hashes land while a batch is still running
 
-processed_files_count = 0
-total_files_count = 0
+logger = logging.getLogger(__name__)
 
-def update_tooltip(icon):
-    """Update the tooltip of the system tray icon with the progress information."""
-    global processed_files_count, total_files_count
-    if total_files_count > 0:
-        percentage = (processed_files_count / total_files_count) * 100
-        icon.title = f"File Hasher: {processed_files_count}/{total_files_count} files processed ({percentage:.2f}%)"
-    else:
-        icon.title = "File Hasher: Initializing..."
+engine = None
+algorithm = None  # resolved in main()
+progress = ProgressTracker(PROGRESS_INTERVAL)
+scheduler = Scheduler(SCHEDULE_POLICIES, LARGE_FILE_THRESHOLD)
+large_files = Queue()  # (WorkItem, hard links) for the large-file lane
+large_in_flight = set()  # their paths, so a rescan does not queue a file again
+large_lock = threading.Lock()
+
+def process_files(files, db_path, links=None):
+    """Check all `files`, then hash the new and changed ones in priority order and update the database.
 
-def process_files_batch(files, db_path, icon):
-    """Process a batch of files, compute their hashes and update the database."""
-    global processed_files_count
+    `links` maps a path in `files` to its other hard links, which get a copy of its row.
+    """
+    links = links or {}
     new_hashes = []
     zero_size_files = []
     error_files = []
 
+    to_hash = []
+
     for file_path in files:
-        if not os.path.exists(file_path):
-            delete_nonexistent_files([file_path], db_path)
+        try:
+            st = os.stat(file_path)
+        except FileNotFoundError:
+            delete_file_from_db([file_path], db_path)
+            progress.add(processed=1)
             continue
-        file_size = os.path.getsize(file_path)
-        last_modified = os.path.getmtime(file_path)
+        file_size = st.st_size
+        last_modified = st.st_mtime
 
         # Check if file hash already exists in the database
         existing_info = get_file_info_from_db(db_path, file_path)
         if existing_info and existing_info[2] == file_size and existing_info[3] == last_modified:
-            processed_files_count += 1
-            update_tooltip(icon)
+            progress.add(processed=1)
             continue
 
         if file_size == 0:
             zero_size_files.append((file_path,))
+            progress.add(processed=1)
             continue
 
-        file_hash, error = hash_file(file_path)
-        if file_hash:
-            new_hashes.append((file_path, file_hash, file_size, last_modified))
+        state = 'changed' if existing_info else 'new'
+        to_hash.append(WorkItem(file_path, file_size, last_modified, state))
+
+    if zero_size_files:
+        save_zero_size_files(zero_size_files, db_path)
+
+    # plan the whole list, so an urgent file late in the listing is not stuck behind earlier
+    # batches; large files go to their own lane, the rest is hashed on the engine's pool
+    regular, large = scheduler.plan(to_hash)
+    for item in large:
+        with large_lock:
+            queued = item.path in large_in_flight
+            large_in_flight.add(item.path)
+        if queued:
+            progress.add(processed=1)  # still being hashed from an earlier scan
         else:
-            error_files.append((file_path, error))
+            # the lane copies the row to the hard links once the hash is saved
+            large_files.put((item, links.pop(item.path, [])))
+
+    # results come back in submission order; save them in small groups as they arrive
+    for i in range(0, len(regular), BATCH_SIZE):
+        batch = regular[i:i + BATCH_SIZE]
+        for item, (file_path, file_hash, error) in zip(batch, engine.hash_files([item.path for item in batch])):
+            if file_hash:
+                new_hashes.append((file_path, file_hash, item.size, item.mtime, algorithm))
+                progress.add(processed=1, hashed=1, bytes=item.size)
+            else:
+                error_files.append((file_path, error))
+                progress.add(processed=1, errors=1)
+            if len(new_hashes) + len(error_files) >= SAVE_GROUP:
+                save_results(new_hashes, error_files, db_path)
+                new_hashes, error_files = [], []
+    save_results(new_hashes, error_files, db_path)
 
-        processed_files_count += 1
-        update_tooltip(icon)
+    # hard links share the inode, so they share the digest of the path that was hashed
+    with large_lock:
+        # primaries still on the large-file lane copy their rows themselves
+        links = {path: aliases for path, aliases in links.items() if path not in large_in_flight}
+    if links:
+        save_link_hashes(links, db_path)
 
+def save_results(new_hashes, error_files, db_path):
     if new_hashes:
         save_hashes_to_db(new_hashes, db_path)
-    if zero_size_files:
-        save_zero_size_files(zero_size_files, db_path)
     if error_files:
         save_error_files(error_files, db_path)
 
-def scan_files(root_path, db_path, icon):
-    """Scan all files in the root directory and process them in batches."""
-    global total_files_count
+def hash_large_files(db_path):
+    """Large-file lane: hash files of at least LARGE_FILE_THRESHOLD bytes one at a time,
+    so they never hold back the batches of smaller files."""
+    while True:
+        item, aliases = large_files.get()
+        try:
+            file_hash, error = engine.hash_file(item.path)
+            if file_hash:
+                save_results([(item.path, file_hash, item.size, item.mtime, algorithm)], [], db_path)
+                if aliases:
+                    save_link_hashes({item.path: aliases}, db_path)
+                progress.add(processed=1, hashed=1, bytes=item.size)
+            else:
+                save_results([], [(item.path, error)], db_path)
+                progress.add(processed=1, errors=1)
+        except Exception:
+            logger.exception("Failed to hash %s", item.path)
+        finally:
+            with large_lock:
+                large_in_flight.discard(item.path)
+
+def start_large_file_lane():
+    """Start the thread that hashes the large-file lane."""
+    thread = threading.Thread(target=hash_large_files, args=(DB_PATH,))
+    thread.daemon = True
+    thread.start()
+
+def scan_files(root_path, db_path):
+    """Scan the root directory and process new or changed files in batches.
+
+    Only directories whose mtime changed since the last scan are listed; every
+    FULL_VERIFY_EVERY-th scan lists the whole tree to catch in-place edits.
+    """
+    backend = LocalFileBackend()
+    # the scan count survives restarts, so a restart does not force a full walk
+    scan_count = int(get_meta(db_path, 'scan_passes', 0))
+    full = scan_count % FULL_VERIFY_EVERY == 0
+    index = DirectoryIndex(backend, db_path)
+    found, removed = index.scan(root_path, full=full)
+    if removed:
+        delete_file_from_db(removed, db_path)
+
+    # hash each inode once; the other hard links get a copy of its row
     files = []
-    for root, dirs, filenames in os.walk(root_path):
-        for filename in filenames:
-            files.append(os.path.join(root, filename))
+    links = {}
+    for file_path, aliases in backend.group_by_inode(found):
+        files.append(file_path)
+        if aliases:
+            links[file_path] = aliases
 
-    total_files_count = len(files)
+    if full:
+        progress.reset(total=len(files))
+    else:
+        progress.add(total=len(files))
 
-    file_batches = [files[i:i + BATCH_SIZE] for i in range(0, len(files), BATCH_SIZE)]
+    if files:
+        with tqdm(desc="Hashing files", unit="file") as pbar:
+            sink = tqdm_sink(pbar)
+            progress.add_sink(sink)
+            try:
+                process_files(files, db_path, links)
+            finally:
+                progress.remove_sink(sink)
+                sink(progress.snapshot())
 
-    with tqdm(total=len(files), desc="Hashing files", unit="file") as pbar:
-        for batch in file_batches:
-            process_files_batch(batch, db_path, icon)
-            pbar.update(len(batch))
-            gc.collect()  # Explicitly call the garbage collector
+    if full:
+        # Check for nonexistent files in the database
+        all_files_in_db = get_all_files_from_db(db_path)
+        nonexistent_files = [f for f in all_files_in_db if not os.path.exists(f)]
+        if nonexistent_files:
+            delete_file_from_db(nonexistent_files, db_path)
+        compact_journal(db_path, JOURNAL_MAX_ROWS)
 
-    # Check for nonexistent files in the database
-    all_files_in_db = get_all_files_from_db(db_path)
-    nonexistent_files = [f for f in all_files_in_db if not os.path.exists(f)]
-    if nonexistent_files:
-        delete_nonexistent_files(nonexistent_files, db_path)
+    index.commit()
+    set_meta(db_path, 'scan_passes', str(scan_count + 1))
 
-class FileEventHandler(FileSystemEventHandler):
-    """Handler for file system events to process created or modified files."""
-    def __init__(self, db_path, icon):
-        self.db_path = db_path
-        self.icon = icon
+class FileEventHandler(QueueingEventHandler, FileSystemEventHandler):
+    """Handler for file system events; queues them for the event worker."""
 
-    def on_created(self, event):
-        if not event.is_directory:
-            process_files_batch([event.src_path], self.db_path, self.icon)
+def process_changed_files(files, db_path):
+    progress.add(total=len(files))
+    process_files(files, db_path)
 
-    def on_modified(self, event):
-        if not event.is_directory:
-            process_files_batch([event.src_path], self.db_path, self.icon)
+def process_events(queue, db_path):
+    """Drain settled events in batches, so a burst costs one hash per final file."""
+    backend = LocalFileBackend()
+    while True:
+        queue.wait()
+        handle_ready_events(queue, db_path, process_changed_files, backend, BATCH_SIZE)
 
-def background_scan(root_path, db_path, icon):
+def start_event_worker(queue):
+    """Start the thread that handles queued file system events."""
+    thread = threading.Thread(target=process_events, args=(queue, DB_PATH))
+    thread.daemon = True
+    thread.start()
+
+def background_scan(root_path, db_path):
     """Continuously scan the directory in the background."""
     while True:
-        scan_files(root_path, db_path, icon)
+        try:
+            scan_files(root_path, db_path)
+        except Exception:
+            logger.exception("Scan of %s failed", root_path)
         time.sleep(5)  # Repeat every 5 seconds
 
-def start_background_scan(icon):
+def start_background_scan():
     """Start the background scanning thread."""
-    thread = threading.Thread(target=background_scan, args=(WATCH_PATH, DB_PATH, icon))
+    thread = threading.Thread(target=background_scan, args=(WATCH_PATH, DB_PATH))
     thread.daemon = True
     thread.start()
 
@@ -131,13 +249,25 @@ def create_image():
 
 def main():
     """Main function to set up the system tray icon and start the background scan."""
+    global engine, algorithm
     create_database(DB_PATH)
+    # same choice as files_hashing.py when both use this database
+    algorithm = resolve_stored_algorithm({'HASH_ALGORITHM': HASH_ALGORITHM, 'HASH_SECURITY': HASH_SECURITY}, DB_PATH)
+    engine = LocalHashingEngine(algorithm, HASH_ENGINE, HASH_WORKERS, cache_mode=CACHE_MODE)
     icon = Icon("File Hasher", create_image(), "File Hasher", menu=Menu(
         MenuItem('Quit', on_exit)
     ))
-    start_background_scan(icon)
+    # the tray tooltip and the meta table (stats.py) follow progress at PROGRESS_INTERVAL
+    progress.add_sink(tray_sink(icon))
+    progress.add_sink(meta_sink(DB_PATH))
+    progress.start()
+    start_large_file_lane()
+    start_background_scan()
+
+    queue = DebouncedEventQueue(EVENT_QUIET_PERIOD)
+    start_event_worker(queue)
 
-    event_handler = FileEventHandler(DB_PATH, icon)
+    event_handler = FileEventHandler(queue)
     observer = Observer()
     observer.schedule(event_handler, path=WATCH_PATH, recursive=True)
     observer.start()
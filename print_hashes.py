@@ -8,11 +8,11 @@ def print_hashes(db_path: str) -> None:
     try:
         cursor.execute("PRAGMA table_info(file_hashes)")
         print("Table info:", cursor.fetchall())
-        cursor.execute("SELECT path, hash, size, last_modified FROM file_hashes")
+        cursor.execute("SELECT path, hash, size, last_modified, algorithm FROM file_hashes")
         rows = cursor.fetchall()
         print(f"\nTotal files: {len(rows)}\n")
-        for file_path, file_hash, file_size, last_modified in rows:
-            print(f"{file_path}\n  hash: {file_hash}\n  size: {file_size}\n  mtime: {last_modified}\n")
+        for file_path, file_hash, file_size, last_modified, algorithm in rows:
+            print(f"{file_path}\n  hash: {file_hash} ({algorithm})\n  size: {file_size}\n  mtime: {last_modified}\n")
     finally:
         conn.close()
 
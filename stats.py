@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import json
 import sqlite3
 import sys
 
@@ -27,6 +28,18 @@ def get_stats(db_path: str):
     conn.close()
     return total, hashed
 
+def get_live_progress(db_path: str):
+    """Latest progress snapshots written by the running services: [(key, snapshot, last_updated)]."""
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    try:
+        c.execute("SELECT key, value, last_updated FROM meta WHERE key LIKE 'progress%' ORDER BY key")
+        rows = [(key, json.loads(value), updated) for key, value, updated in c.fetchall()]
+    except sqlite3.OperationalError:
+        rows = []  # table meta does not exist yet
+    conn.close()
+    return rows
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("Usage: stats.py <db_path>")
@@ -52,3 +65,12 @@ if __name__ == "__main__":
             percent = hashed / total * 100
             print(f"Remaining: {left}")
             print(f"Progress: {percent:.2f}%")
+
+    for key, snap, updated in get_live_progress(db_path):
+        print(f"\n--- Live {key} (updated {updated}) ---")
+        if snap["total"]:
+            print(f"Processed: {snap['processed']}/{snap['total']} ({snap['processed'] / snap['total'] * 100:.2f}%)")
+        else:
+            print(f"Processed: {snap['processed']}")
+        print(f"Hashed: {snap['hashed']}  Errors: {snap['errors']}")
+        print(f"Rate: {snap['files_per_s']:.1f} files/s, {snap['bytes_per_s'] / 1e6:.1f} MB/s")
@@ -0,0 +1,30 @@
+import json
+
+import pytest
+
+from utils.config import Config
+from files_hashing import FileHashingService
+
+@pytest.fixture
+def make_config(tmp_path):
+    """Write a config.json for a local scan of `root` and load it.
+
+    Keyword arguments override or extend the defaults.
+    """
+    def make(root, **overrides):
+        path = tmp_path / "config.json"
+        path.write_text(json.dumps(dict({
+            "BACKEND": "local",
+            "DB_PATH": str(tmp_path / "hashes.db"),
+            "PATHS": [str(root)],
+            "HASH_ALGORITHM": "sha256",
+        }, **overrides)))
+        return Config(str(path))
+    return make
+
+@pytest.fixture
+def make_service(make_config):
+    """A FileHashingService over `root`; see make_config for the overrides."""
+    def make(root, **overrides):
+        return FileHashingService(make_config(root, **overrides))
+    return make
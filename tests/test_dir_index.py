@@ -0,0 +1,144 @@
+import os
+
+import pytest
+
+from utils.database import create_database
+from utils.dir_index import DirectoryIndex
+from utils.files import LocalFileBackend
+
+OLD = 1_000_000_000
+
+class CountingBackend(LocalFileBackend):
+    def __init__(self):
+        self.listed = []
+    def list_dir(self, path):
+        self.listed.append(path)
+        return super().list_dir(path)
+
+class DeniedBackend(CountingBackend):
+    """Refuses to list one directory, like "System Volume Information"."""
+    def __init__(self, denied):
+        super().__init__()
+        self.denied = denied
+    def list_dir(self, path):
+        if path == self.denied:
+            raise PermissionError(13, "Permission denied", path)
+        return super().list_dir(path)
+
+def age(*paths):
+    for path in paths:
+        os.utime(path, (OLD, OLD))
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "index.db")
+    create_database(path)
+    return path
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "root"
+    for sub in ("a", "b", "a/deep"):
+        (root / sub).mkdir(parents=True)
+    for name in ("a/1.txt", "b/2.txt", "a/deep/3.txt", "top.txt"):
+        (root / name).write_text(name)
+    age(root, root / "a", root / "b", root / "a" / "deep")
+    return root
+
+def scan(db_path, root, full=False):
+    backend = CountingBackend()
+    index = DirectoryIndex(backend, db_path)
+    files, removed = index.scan(str(root), full=full)
+    index.commit()
+    return sorted(files), sorted(removed), sorted(backend.listed)
+
+def test_first_scan_lists_everything(db_path, tree):
+    files, removed, listed = scan(db_path, tree)
+    assert files == sorted(str(tree / n) for n in ("a/1.txt", "b/2.txt", "a/deep/3.txt", "top.txt"))
+    assert removed == []
+    assert len(listed) == 4
+
+def test_unchanged_tree_lists_nothing(db_path, tree):
+    scan(db_path, tree)
+    assert scan(db_path, tree) == ([], [], [])
+
+def test_only_changed_directory_is_listed(db_path, tree):
+    scan(db_path, tree)
+    (tree / "a" / "deep" / "new.txt").write_text("new")
+    (tree / "b" / "2.txt").unlink()
+    os.utime(tree / "a" / "deep", (OLD + 10, OLD + 10))
+    os.utime(tree / "b", (OLD + 10, OLD + 10))
+    files, removed, listed = scan(db_path, tree)
+    assert listed == sorted([str(tree / "a" / "deep"), str(tree / "b")])
+    assert files == sorted([str(tree / "a" / "deep" / "3.txt"), str(tree / "a" / "deep" / "new.txt")])
+    assert removed == [str(tree / "b" / "2.txt")]
+
+def test_removed_directory_drops_its_files(db_path, tree):
+    scan(db_path, tree)
+    (tree / "a" / "deep" / "3.txt").unlink()
+    (tree / "a" / "deep").rmdir()
+    os.utime(tree / "a", (OLD + 10, OLD + 10))
+    files, removed, _ = scan(db_path, tree)
+    assert files == [str(tree / "a" / "1.txt")]
+    assert removed == [str(tree / "a" / "deep" / "3.txt")]
+    assert scan(db_path, tree) == ([], [], [])
+
+def test_full_scan_lists_everything(db_path, tree):
+    scan(db_path, tree)
+    _, _, listed = scan(db_path, tree, full=True)
+    assert len(listed) == 4
+
+def test_uncommitted_scan_is_repeated(db_path, tree):
+    index = DirectoryIndex(LocalFileBackend(), db_path)
+    index.scan(str(tree))
+    files, _, _ = scan(db_path, tree)
+    assert len(files) == 4
+
+def test_recent_directory_is_listed_again(db_path, tree):
+    os.utime(tree / "b", None)  # mtime = now, a same-second change could follow
+    scan(db_path, tree)
+    _, _, listed = scan(db_path, tree)
+    assert listed == [str(tree / "b")]
+
+def test_sibling_prefix_is_not_removed(db_path, tree, tmp_path):
+    sibling = tmp_path / "root2"
+    sibling.mkdir()
+    (sibling / "x.txt").write_text("x")
+    age(sibling)
+    scan(db_path, sibling)
+    scan(db_path, tree)
+    assert scan(db_path, sibling) == ([], [], [])
+
+def test_unreadable_directory_is_skipped(db_path, tree):
+    scan(db_path, tree)
+    os.utime(tree / "a", (OLD + 10, OLD + 10))
+    index = DirectoryIndex(DeniedBackend(str(tree / "a")), db_path)
+    files, removed = index.scan(str(tree), full=True)
+    index.commit()
+    assert sorted(files) == sorted([str(tree / "b" / "2.txt"), str(tree / "a" / "deep" / "3.txt"), str(tree / "top.txt")])
+    assert removed == []
+    # the old entry is kept, so "a" is listed as soon as it can be read again
+    _, _, listed = scan(db_path, tree)
+    assert listed == [str(tree / "a")]
+
+def test_service_hashes_around_unreadable_directory(tree, make_config):
+    from utils.database import get_file_info_from_db
+    from files_hashing import FileHashingService
+    def no_sleep(seconds):
+        raise AssertionError("treated as a connection drop")
+    service = FileHashingService(make_config(tree), sleep_fn=no_sleep,
+                                 backend_factory=lambda config: DeniedBackend(str(tree / "a")))
+    service.run_once()
+    assert get_file_info_from_db(service.db_path, str(tree / "b" / "2.txt")) is not None
+    assert get_file_info_from_db(service.db_path, str(tree / "a" / "1.txt")) is None
+
+def test_full_verify_rhythm_survives_restarts(tree, make_service, monkeypatch):
+    fulls = []
+    real_scan = DirectoryIndex.scan
+    def recording_scan(self, root, full=False):
+        fulls.append(full)
+        return real_scan(self, root, full=full)
+    monkeypatch.setattr(DirectoryIndex, "scan", recording_scan)
+    for _ in range(4):
+        make_service(tree, FULL_VERIFY_EVERY=3).run_once()  # a fresh process per cron run
+    assert fulls == [True, False, False, True]
@@ -0,0 +1,68 @@
+from collections import namedtuple
+
+import pytest
+
+from utils.database import create_database, save_hashes_to_db, get_file_info_from_db
+from utils.event_queue import DebouncedEventQueue, DELETED
+from utils.event_handler import QueueingEventHandler, handle_ready_events
+from utils.files import LocalFileBackend
+
+Event = namedtuple("Event", "src_path dest_path is_directory")
+
+def file_event(path, dest=None):
+    return Event(path, dest, False)
+
+def dir_event(path, dest=None):
+    return Event(path, dest, True)
+
+@pytest.fixture
+def queue():
+    return DebouncedEventQueue(quiet_period=0)
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "events.db")
+    create_database(path)
+    return path
+
+def test_handler_queues_file_events(queue):
+    handler = QueueingEventHandler(queue)
+    handler.on_created(file_event("/a"))
+    handler.on_modified(file_event("/b"))
+    handler.on_deleted(file_event("/c"))
+    handler.on_moved(file_event("/d", "/e"))
+    handler.on_modified(dir_event("/dir"))  # directory mtime changes are not files
+    changed, deleted = queue.pop_ready()
+    assert sorted(changed) == ["/a", "/b", "/e"]
+    assert sorted(deleted) == ["/c", "/d"]
+
+def test_moved_directory_is_queued_as_one_path(queue, tmp_path, monkeypatch):
+    def no_listing(self, root):
+        raise AssertionError("listed on the observer thread")
+    monkeypatch.setattr(LocalFileBackend, "list_files", no_listing)
+    QueueingEventHandler(queue).on_moved(dir_event(str(tmp_path / "old"), str(tmp_path / "new")))
+    assert queue.pop_ready() == ([str(tmp_path / "new")], [])
+
+def test_round_expands_directories_and_applies_deletes(queue, db_path, tmp_path):
+    moved = tmp_path / "new"
+    (moved / "sub").mkdir(parents=True)
+    (moved / "x.bin").write_bytes(b"x")
+    (moved / "sub" / "y.bin").write_bytes(b"y")
+    save_hashes_to_db([("/gone.bin", "d", 1, 1, "sha256")], db_path)
+    queue.push(str(moved))
+    queue.push(str(tmp_path / "z.bin"))
+    queue.push("/gone.bin", DELETED)
+    batches = []
+    handle_ready_events(queue, db_path, lambda files, db: batches.append(sorted(files)), LocalFileBackend())
+    assert batches == [sorted([str(moved / "x.bin"), str(moved / "sub" / "y.bin"), str(tmp_path / "z.bin")])]
+    assert get_file_info_from_db(db_path, "/gone.bin") is None
+
+def test_round_survives_errors(queue, db_path):
+    def failing(files, db):
+        raise OSError("database is locked")
+    queue.push("/a")
+    handle_ready_events(queue, db_path, failing, LocalFileBackend())  # logged, not raised
+    batches = []
+    queue.push("/b")
+    handle_ready_events(queue, db_path, lambda files, db: batches.append(files), LocalFileBackend())
+    assert batches == [["/b"]]
@@ -0,0 +1,60 @@
+import threading
+
+from utils.event_queue import DebouncedEventQueue
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+def test_burst_is_coalesced_after_quiet_period():
+    clock = FakeClock()
+    queue = DebouncedEventQueue(quiet_period=2, clock=clock)
+    for _ in range(50):
+        queue.push("/a")
+        clock.now += 0.1
+    assert queue.pop_ready() == ([], [])
+    clock.now += 2
+    assert queue.pop_ready() == (["/a"], [])
+    assert len(queue) == 0
+
+def test_new_event_restarts_timer():
+    clock = FakeClock()
+    queue = DebouncedEventQueue(quiet_period=2, clock=clock)
+    queue.push("/a")
+    queue.push("/b")
+    clock.now = 1.5
+    queue.push("/a")
+    clock.now = 2.5
+    assert queue.pop_ready() == (["/b"], [])
+    clock.now = 3.5
+    assert queue.pop_ready() == (["/a"], [])
+
+def test_last_event_wins_and_moves():
+    clock = FakeClock()
+    queue = DebouncedEventQueue(quiet_period=1, clock=clock)
+    queue.push("/tmp.part")
+    queue.push_move("/tmp.part", "/final")
+    queue.push("/gone")
+    queue.push("/gone", "deleted")
+    clock.now = 5
+    changed, deleted = queue.pop_ready()
+    assert changed == ["/final"]
+    assert sorted(deleted) == ["/gone", "/tmp.part"]
+
+def test_pop_ready_respects_max_items():
+    clock = FakeClock()
+    queue = DebouncedEventQueue(quiet_period=0, clock=clock)
+    for i in range(5):
+        queue.push(f"/f{i}")
+    assert queue.pop_ready(max_items=3) == (["/f0", "/f1", "/f2"], [])
+    assert queue.pop_ready() == (["/f3", "/f4"], [])
+
+def test_wait_wakes_on_push():
+    queue = DebouncedEventQueue(quiet_period=0)
+    timer = threading.Timer(0.05, queue.push, args=("/a",))
+    timer.start()
+    queue.wait(timeout=5)
+    timer.join()
+    assert queue.pop_ready() == (["/a"], [])
@@ -62,14 +62,34 @@ def test_local_file_backend(tmp_path):
         data = f.read()
         assert data == b"hello world"
     assert backend.get_file_size(str(test_file)) == len("hello world")
+    (tmp_path / "sub").mkdir()
+    assert backend.list_dir(str(tmp_path)) == (["sub"], ["test.txt"])
 
 def test_file_backend_interface():
     backend = FileBackend()
     with pytest.raises(NotImplementedError):
         backend.list_files("/tmp")
+    with pytest.raises(NotImplementedError):
+        backend.list_dir("/tmp")
     with pytest.raises(NotImplementedError):
         backend.stat("/tmp/file")
     with pytest.raises(NotImplementedError):
         backend.open("/tmp/file")
     with pytest.raises(NotImplementedError):
         backend.get_file_size("/tmp/file")
+
+def test_local_list_unique_files(tmp_path):
+    backend = LocalFileBackend()
+    original = tmp_path / "a.txt"
+    original.write_text("shared")
+    (tmp_path / "sub").mkdir()
+    os.link(original, tmp_path / "sub" / "b.txt")
+    os.link(original, tmp_path / "c.txt")
+    (tmp_path / "single.txt").write_text("single")
+    result = dict(backend.list_unique_files(str(tmp_path)))
+    assert result[str(tmp_path / "single.txt")] == []
+    linked = [p for p in result if p != str(tmp_path / "single.txt")]
+    assert len(linked) == 1
+    assert sorted([linked[0]] + result[linked[0]]) == sorted(
+        str(p) for p in (original, tmp_path / "sub" / "b.txt", tmp_path / "c.txt")
+    )
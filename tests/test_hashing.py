@@ -4,7 +4,7 @@ import os
 import pytest
 import hashlib
 
-from utils.hash_file import hash_file
+from utils.hash_file import hash_file, available_algorithms, select_algorithm, resolve_algorithm, resolve_stored_algorithm
 from utils.files import LocalFileBackend, FileBackend
 
 class DummySFTPFile(io.BytesIO):
@@ -56,4 +56,64 @@ def test_hash_file_sftp_error():
     backend = FailingSFTPBackend()
     md5, error = hash_file(backend, "/dummy/path.txt")
     assert md5 is None
-    assert error is not None
\ No newline at end of file
+    assert error is not None
+
+def test_registry_security_levels():
+    crypto = available_algorithms("crypto")
+    assert "sha256" in crypto and "blake2b" in crypto
+    assert "md5" not in crypto
+    assert set(crypto) <= set(available_algorithms("none"))
+
+def test_hash_file_registered_algorithm():
+    content = b"blake content"
+    backend = DummySFTPBackend(content)
+    digest, error = hash_file(backend, "/dummy/path.txt", "blake2b")
+    assert error is None
+    assert digest == hashlib.blake2b(content).hexdigest()
+
+def test_select_algorithm_meets_security_level():
+    name = select_algorithm("crypto", sample_size=64 * 1024)
+    assert name in available_algorithms("crypto")
+
+def test_resolve_algorithm():
+    assert resolve_algorithm({"HASH_ALGORITHM": "sha256"}) == "sha256"
+    assert resolve_algorithm({"HASH_ALGORITHM": "auto", "HASH_SECURITY": "crypto"}) in available_algorithms("crypto")
+    with pytest.raises(ValueError):
+        resolve_algorithm({"HASH_ALGORITHM": "no-such-hash"})
+
+def test_auto_algorithm_is_kept_per_database(tmp_path, make_service, monkeypatch):
+    import utils.hash_file as hash_file_module
+    from utils.database import create_database
+    db_path = str(tmp_path / "hashes.db")
+    create_database(db_path)
+    picks = iter(["blake2b", "sha256"])  # what successive benchmarks would return
+    def fake_resolve(config):
+        return next(picks) if config.get("HASH_ALGORITHM") in (None, "auto") else config.get("HASH_ALGORITHM")
+    monkeypatch.setattr(hash_file_module, "resolve_algorithm", fake_resolve)
+    assert resolve_stored_algorithm({}, db_path) == "blake2b"
+    assert resolve_stored_algorithm({"HASH_ALGORITHM": "auto"}, db_path) == "blake2b"  # no second benchmark
+    assert resolve_stored_algorithm({"HASH_ALGORITHM": "sha512"}, db_path) == "sha512"
+    assert resolve_stored_algorithm({}, db_path) == "sha512"
+    assert make_service(tmp_path / "data", HASH_ALGORITHM="auto").algorithm == "sha512"
+
+def test_legacy_rows_are_migrated_not_rehashed(tmp_path, make_service, monkeypatch):
+    import sqlite3
+    import files_hashing
+    from utils.database import get_file_info_from_db, get_journal_bounds
+    (tmp_path / "data").mkdir()
+    path = tmp_path / "data" / "legacy.bin"
+    path.write_bytes(b"legacy")
+    st = os.stat(path)
+    # a database written by the baseline service: no algorithm column, sha256 digests
+    conn = sqlite3.connect(tmp_path / "hashes.db")
+    conn.execute("CREATE TABLE file_hashes (path TEXT PRIMARY KEY, hash TEXT, size INTEGER, last_modified INTEGER)")
+    conn.execute("INSERT INTO file_hashes VALUES (?, ?, ?, ?)",
+                 (str(path), hashlib.sha256(b"legacy").hexdigest(), st.st_size, int(st.st_mtime)))
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(files_hashing, "hash_local_file", lambda *args: pytest.fail("legacy row re-hashed"))
+    service = make_service(tmp_path / "data")
+    service.run_once()
+    assert get_file_info_from_db(service.db_path, str(path))[1:] == (
+        hashlib.sha256(b"legacy").hexdigest(), st.st_size, int(st.st_mtime), "sha256")
+    assert get_journal_bounds(service.db_path) == (None, None)
@@ -0,0 +1,159 @@
+import time
+import hashlib
+
+import pytest
+
+from utils.database import (
+    create_database,
+    enqueue_jobs,
+    claim_jobs,
+    complete_jobs,
+    release_jobs,
+    reclaim_expired_leases,
+    count_jobs,
+    get_file_info_from_db,
+    save_hashes_to_db,
+)
+from utils.files import LocalFileBackend
+from stats import get_stats
+from files_hashing import FileHashingService, run_local_workers
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    create_database(path)
+    return path
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "data"
+    (root / "sub").mkdir(parents=True)
+    files = {}
+    for i in range(20):
+        f = root / ("sub" if i % 2 else "") / f"file{i}.bin"
+        f.write_bytes(f"content {i}".encode())
+        files[str(f)] = hashlib.sha256(f"content {i}".encode()).hexdigest()
+    return root, files
+
+@pytest.fixture
+def config(tree, make_config):
+    root, _ = tree
+    return make_config(root, WORKER_POLL=0.05)
+
+def test_claim_is_exclusive(db_path):
+    enqueue_jobs([(f"/f{i}", "file") for i in range(5)], db_path)
+    first = claim_jobs(db_path, "w1", limit=3)
+    second = claim_jobs(db_path, "w2", limit=3)
+    assert len(first) == 3
+    assert len(second) == 2
+    assert not {p for p, _, _ in first} & {p for p, _, _ in second}
+    assert claim_jobs(db_path, "w3", limit=3) == []
+
+def test_dir_jobs_are_claimed_first(db_path):
+    enqueue_jobs([("/a/file", "file"), ("/b", "dir")], db_path)
+    assert claim_jobs(db_path, "w1")[0][:2] == ("/b", "dir")
+
+def test_expired_lease_is_reclaimed(db_path):
+    enqueue_jobs([("/f", "file")], db_path)
+    claim_jobs(db_path, "dead", lease_seconds=10, now=1000)
+    assert claim_jobs(db_path, "w2", now=1005) == []
+    assert reclaim_expired_leases(db_path, now=1011) == 1
+    assert claim_jobs(db_path, "w2", now=1012) == [("/f", "file", 2)]
+
+def test_complete_ignores_lost_lease(db_path):
+    enqueue_jobs([("/f", "file")], db_path)
+    claim_jobs(db_path, "slow", lease_seconds=1, now=1000)
+    claim_jobs(db_path, "fast", now=1002)
+    complete_jobs(db_path, "slow", ["/f"])
+    assert count_jobs(db_path) == {"leased": 1}
+    release_jobs(db_path, "fast", ["/f"])
+    assert count_jobs(db_path) == {"pending": 1}
+
+def test_enqueue_resets_finished_jobs_only(db_path):
+    enqueue_jobs([("/f", "file"), ("/g", "file")], db_path)
+    claim_jobs(db_path, "w1", limit=2)
+    complete_jobs(db_path, "w1", ["/f"])
+    enqueue_jobs([("/f", "file"), ("/g", "file")], db_path)
+    assert count_jobs(db_path) == {"pending": 1, "leased": 1}
+
+def test_worker_drains_queue(config, tree):
+    _, files = tree
+    service = FileHashingService(config)
+    service.enqueue_pass()
+    service.run_worker("w1", exit_when_idle=True)
+    assert count_jobs(service.db_path) == {"done": len(files) + 2}  # + root and sub directory jobs
+    for path, digest in files.items():
+        assert get_file_info_from_db(service.db_path, path)[1] == digest
+
+def test_local_worker_processes(config, tree):
+    _, files = tree
+    service = FileHashingService(config)
+    service.enqueue_pass()
+    run_local_workers(config, 3, exit_when_idle=True)
+    assert count_jobs(service.db_path) == {"done": len(files) + 2}  # + root and sub directory jobs
+    for path, digest in files.items():
+        assert get_file_info_from_db(service.db_path, path)[1] == digest
+
+def test_dir_job_queues_subdirectories(config, tree):
+    root, _ = tree
+    service = FileHashingService(config)
+    service._run_job(LocalFileBackend(), str(root), "dir")
+    jobs = claim_jobs(service.db_path, "w1", limit=100)
+    assert (str(root / "sub"), "dir", 1) in jobs
+    assert sum(1 for _, kind, _ in jobs if kind == "file") == 10
+
+def test_heartbeat_keeps_batch_leased(config, tree):
+    _, files = tree
+    service = FileHashingService(config)
+    service.lease_s = 0.3
+    enqueue_jobs([(path, "file") for path in sorted(files)[:3]], service.db_path)
+    reclaimed = []
+    run_job = service._run_job
+    def slow_run_job(backend, path, kind):
+        time.sleep(0.4)  # longer than the lease
+        reclaimed.append(reclaim_expired_leases(service.db_path))
+        return run_job(backend, path, kind)
+    service._run_job = slow_run_job
+    service.run_worker("w1", exit_when_idle=True)
+    assert reclaimed == [0, 0, 0]
+    assert count_jobs(service.db_path) == {"done": 3}
+
+def test_missing_dir_job_completes_without_retry(config, tree, tmp_path):
+    root, _ = tree
+    def no_sleep(seconds):
+        if seconds != config.get("WORKER_POLL"):
+            raise AssertionError("treated as a connection drop")
+    service = FileHashingService(config, sleep_fn=no_sleep)
+    gone = str(root / "gone")
+    save_hashes_to_db([(gone + "/old.bin", "d", 1, 1, "sha256"), (gone + "x/keep.bin", "d", 1, 1, "sha256")],
+                      service.db_path)
+    enqueue_jobs([(gone, "dir")], service.db_path)
+    service.run_worker("w1", exit_when_idle=True)
+    assert count_jobs(service.db_path) == {"done": 1}
+    assert get_file_info_from_db(service.db_path, gone + "/old.bin") is None
+    assert get_file_info_from_db(service.db_path, gone + "x/keep.bin") is not None
+
+def test_unreadable_dir_job_fails_without_retry(config, tree, monkeypatch):
+    root, _ = tree
+    def no_sleep(seconds):
+        if seconds != config.get("WORKER_POLL"):
+            raise AssertionError("treated as a connection drop")
+    def denied(self, path):
+        raise PermissionError(13, "Permission denied", path)
+    monkeypatch.setattr(LocalFileBackend, "list_dir", denied)
+    service = FileHashingService(config, sleep_fn=no_sleep)
+    enqueue_jobs([(str(root), "dir")], service.db_path)
+    service.run_worker("w1", exit_when_idle=True)
+    assert count_jobs(service.db_path) == {"failed": 1}
+
+def test_coordinator_counts_file_jobs_of_this_pass(config, tree, tmp_path):
+    root, files = tree
+    service = FileHashingService(config)
+    enqueue_jobs([(str(root / "deleted-long-ago.bin"), "file")], service.db_path)
+    claim_jobs(service.db_path, "w0")
+    complete_jobs(service.db_path, "w0", [str(root / "deleted-long-ago.bin")])
+    service.enqueue_pass()
+    service.run_worker("w1", exit_when_idle=True)
+    service.wait_for_jobs()
+    assert count_jobs(service.db_path, "file") == {"done": len(files)}
+    assert get_stats(service.db_path)[0] == len(files)
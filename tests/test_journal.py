@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from utils.database import (
+    create_database,
+    save_hashes_to_db,
+    save_link_hashes,
+    delete_file_from_db,
+    get_changes_since,
+    get_journal_bounds,
+    compact_journal,
+)
+import journal
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "journal.db")
+    create_database(path)
+    return path
+
+def ops(db_path, since=0):
+    return [(path, op, digest) for _, path, op, digest, *_ in get_changes_since(db_path, since)]
+
+def test_insert_update_delete_are_journaled(db_path):
+    save_hashes_to_db([("/a", "h1", 1, 10, "sha256"), ("/b", "h2", 2, 20, "sha256")], db_path)
+    save_hashes_to_db([("/a", "h1", 1, 11, "sha256")], db_path)  # mtime only: not a change
+    save_hashes_to_db([("/a", "h3", 1, 12, "sha256")], db_path)
+    delete_file_from_db(["/b", "/never-stored"], db_path)
+    assert ops(db_path) == [
+        ("/a", "insert", "h1"),
+        ("/b", "insert", "h2"),
+        ("/a", "update", "h3"),
+        ("/b", "delete", None),
+    ]
+
+def test_changes_since_cursor(db_path):
+    save_hashes_to_db([("/a", "h1", 1, 10, "sha256")], db_path)
+    (seq, *_), = get_changes_since(db_path, 0)
+    save_hashes_to_db([("/b", "h2", 1, 10, "sha256")], db_path)
+    assert ops(db_path, seq) == [("/b", "insert", "h2")]
+    assert get_changes_since(db_path, seq + 1) == []
+
+def test_link_hashes_are_journaled(db_path):
+    save_hashes_to_db([("/a", "h1", 1, 10, "sha256")], db_path)
+    save_link_hashes({"/a": ["/b"]}, db_path)
+    assert ops(db_path)[-1] == ("/b", "insert", "h1")
+
+def test_compaction_keeps_latest_and_bounds_size(db_path):
+    for i in range(5):
+        save_hashes_to_db([("/a", f"h{i}", 1, i, "sha256")], db_path)
+    for name in "bcd":
+        save_hashes_to_db([(f"/{name}", "x", 1, 0, "sha256")], db_path)
+    _, last = get_journal_bounds(db_path)
+    assert compact_journal(db_path, max_rows=2) == 6
+    assert ops(db_path) == [("/c", "insert", "x"), ("/d", "insert", "x")]
+    save_hashes_to_db([("/e", "x", 1, 0, "sha256")], db_path)
+    assert get_journal_bounds(db_path)[1] == last + 1  # seq never goes back
+
+def test_cli_since(db_path, capsys):
+    save_hashes_to_db([("/a", "h1", 1, 10, "sha256")], db_path)
+    journal.main([db_path, "since", "0"])
+    entry = json.loads(capsys.readouterr().out)
+    assert entry["path"] == "/a" and entry["op"] == "insert" and entry["hash"] == "h1"
+
+def test_cli_warns_about_compacted_gap(db_path, capsys):
+    for name in "abc":
+        save_hashes_to_db([(f"/{name}", "x", 1, 0, "sha256")], db_path)
+    compact_journal(db_path, max_rows=1)
+    journal.main([db_path, "since", "0"])
+    assert "compacted" in capsys.readouterr().err
@@ -0,0 +1,203 @@
+import os
+import sys
+import subprocess
+import hashlib
+
+import pytest
+
+from utils.database import get_file_info_from_db
+from utils.local_engine import (
+    LocalHashingEngine,
+    CACHE_MODES,
+    hash_local_file,
+    make_engine,
+    cached_bytes,
+    evict_from_page_cache,
+    _hash_sparse,
+)
+
+@pytest.fixture
+def files(tmp_path):
+    result = {}
+    for i, size in enumerate([0, 1, 4095, 4096, 300 * 1024]):
+        path = tmp_path / f"file{i}.bin"
+        data = bytes(j % 251 for j in range(size))
+        path.write_bytes(data)
+        result[str(path)] = hashlib.sha256(data).hexdigest()
+    return result
+
+@pytest.mark.parametrize("mmap_threshold", [0, 1])
+def test_hash_local_file_matches_hashlib(files, mmap_threshold):
+    for path, expected in files.items():
+        digest, error = hash_local_file(path, "sha256", chunk_size=4096, mmap_threshold=mmap_threshold)
+        assert error is None
+        assert digest == expected
+
+@pytest.mark.parametrize("cache_mode", CACHE_MODES)
+def test_cache_modes_match_hashlib(files, cache_mode):
+    for path, expected in files.items():
+        digest, error = hash_local_file(path, "sha256", chunk_size=4096, cache_mode=cache_mode)
+        assert error is None
+        assert digest == expected
+
+def test_fadvise_leaves_no_pages_behind(tmp_path):
+    path = tmp_path / "big.bin"
+    with open(path, "wb") as f:
+        f.write(b"x" * (1024 * 1024))
+        os.fsync(f.fileno())  # dirty pages cannot be dropped
+    evict_from_page_cache(str(path))
+    hash_local_file(str(path), "sha256", cache_mode="fadvise")
+    cached = cached_bytes(str(path))
+    if cached is None:
+        pytest.skip("mincore() not available")
+    if cached == path.stat().st_size:
+        pytest.skip("filesystem keeps files in memory (tmpfs)")
+    assert cached == 0
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_fadvise_keeps_pages_cached_before_the_pass(tmp_path, sparse):
+    path = tmp_path / "hot.bin"
+    part = 4 * 1024 * 1024
+    with open(path, "wb") as f:
+        f.write(b"c" * part)
+        if sparse:
+            f.seek(part, os.SEEK_CUR)  # a hole in the middle
+        f.write(b"h" * part)
+        os.fsync(f.fileno())
+    evict_from_page_cache(str(path))
+    with open(path, "rb") as f:
+        f.seek(-part, os.SEEK_END)
+        f.read()  # another application's hot data at the end
+    before = cached_bytes(str(path))
+    if before is None:
+        pytest.skip("mincore() not available")
+    if before == path.stat().st_size:
+        pytest.skip("filesystem keeps files in memory (tmpfs)")
+    hash_local_file(str(path), "sha256", chunk_size=64 * 1024, cache_mode="fadvise")
+    assert cached_bytes(str(path)) == before
+
+def test_engine_rejects_unknown_cache_mode():
+    with pytest.raises(ValueError):
+        LocalHashingEngine("sha256", "serial", cache_mode="bypass")
+
+def test_hash_local_file_missing():
+    digest, error = hash_local_file("/non/existent/file.bin")
+    assert digest is None
+    assert error is not None
+
+@pytest.mark.parametrize("mode", ["serial", "thread", "process"])
+def test_engine_modes(files, mode):
+    with LocalHashingEngine("sha256", mode, workers=2) as engine:
+        results = list(engine.hash_files(list(files)))
+    assert [path for path, _, _ in results] == list(files)
+    assert {path: digest for path, digest, _ in results} == files
+
+def test_engine_rejects_unknown_mode():
+    with pytest.raises(ValueError):
+        LocalHashingEngine("sha256", "gpu")
+
+TRUNCATE_WHILE_HASHING = """
+import hashlib, os, sys
+from utils.hash_file import register_hasher
+from utils.local_engine import hash_local_file
+
+path = sys.argv[1]
+class Truncating:
+    def __init__(self):
+        self.inner = hashlib.sha256()
+    def update(self, data):
+        os.truncate(path, 0)  # e.g. log rotation while the file is being hashed
+        self.inner.update(data)
+    def hexdigest(self):
+        return self.inner.hexdigest()
+register_hasher("truncating", Truncating, "none")
+hash_local_file(path, "truncating", chunk_size=64 * 1024)
+"""
+
+def test_truncation_while_hashing_does_not_kill_the_process(tmp_path):
+    path = tmp_path / "rotated.log"
+    path.write_bytes(b"x" * (4 * 1024 * 1024))
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", TRUNCATE_WHILE_HASHING, str(path)], cwd=root)
+    assert result.returncode == 0  # mmap would die with SIGBUS here
+
+def test_make_engine_defaults_to_backend():
+    assert make_engine({}, "sha256") is None
+    assert make_engine({"HASH_ENGINE": "thread"}, "sha256").mode == "thread"
+
+def test_service_uses_engine(tmp_path, files, make_service):
+    service = make_service(tmp_path, HASH_ENGINE="thread")
+    service.run_once()
+    for path, expected in files.items():
+        row = get_file_info_from_db(service.db_path, path)
+        if row is None:
+            continue  # empty file
+        assert row[1] == expected
+        assert row[4] == "sha256"
+
+def _write_sparse(path, size, extents):
+    with open(path, "wb") as f:
+        f.truncate(size)
+        for offset, data in extents:
+            f.seek(offset)
+            f.write(data)
+    expected = bytearray(size)
+    for offset, data in extents:
+        expected[offset:offset + len(data)] = data
+    return hashlib.sha256(expected).hexdigest()
+
+@pytest.mark.parametrize("extents", [
+    [],
+    [(0, b"head")],
+    [(5 * 1024 * 1024, b"middle" * 1000)],
+    [(8 * 1024 * 1024 - 3, b"end")],
+])
+def test_sparse_file_matches_full_read(tmp_path, extents):
+    path = tmp_path / "sparse.img"
+    expected = _write_sparse(path, 8 * 1024 * 1024, extents)
+    digest, error = hash_local_file(str(path), "sha256", chunk_size=64 * 1024)
+    assert error is None
+    assert digest == expected
+
+def test_hash_sparse_directly(tmp_path):
+    path = tmp_path / "sparse.img"
+    expected = _write_sparse(path, 3 * 1024 * 1024 + 17, [(1024 * 1024, b"data" * 100)])
+    hasher = hashlib.sha256()
+    with open(path, "rb", buffering=0) as f:
+        _hash_sparse(f, hasher, os.fstat(f.fileno()).st_size, 4096)
+    assert hasher.hexdigest() == expected
+
+def test_service_hashes_each_inode_once(tmp_path, make_service, monkeypatch):
+    import files_hashing
+    root = tmp_path / "data"
+    root.mkdir()
+    (root / "a.bin").write_bytes(b"linked")
+    for name in ("b.bin", "c.bin"):
+        os.link(root / "a.bin", root / name)
+    calls = []
+    real_hash_file = files_hashing.hash_local_file
+    def counting_hash_file(path, algorithm):
+        calls.append(path)
+        return real_hash_file(path, algorithm)
+    monkeypatch.setattr(files_hashing, "hash_local_file", counting_hash_file)
+    service = make_service(root)
+    service.run_once()
+    assert len(calls) == 1
+    for name in ("a.bin", "b.bin", "c.bin"):
+        assert get_file_info_from_db(service.db_path, str(root / name))[1] == hashlib.sha256(b"linked").hexdigest()
+
+def test_service_reads_sparse_files_without_engine(tmp_path, make_service, monkeypatch):
+    import utils.local_engine
+    root = tmp_path / "data"
+    root.mkdir()
+    expected = _write_sparse(root / "sparse.img", 8 * 1024 * 1024, [(1024 * 1024, b"data")])
+    calls = []
+    real_hash_sparse = utils.local_engine._hash_sparse
+    def recording_hash_sparse(*args, **kwargs):
+        calls.append(args[0].name)
+        return real_hash_sparse(*args, **kwargs)
+    monkeypatch.setattr(utils.local_engine, "_hash_sparse", recording_hash_sparse)
+    service = make_service(root)  # HASH_ENGINE defaults to "backend"
+    service.run_once()
+    assert calls == [str(root / "sparse.img")]
+    assert get_file_info_from_db(service.db_path, str(root / "sparse.img"))[1] == expected
@@ -0,0 +1,91 @@
+from utils.database import create_database
+from utils.progress import ProgressTracker, meta_sink, tray_sink, tqdm_sink
+from stats import get_live_progress
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+def test_counters_and_rates():
+    clock = FakeClock()
+    progress = ProgressTracker(clock=clock)
+    progress.reset(total=10)
+    progress.add(processed=1)
+    progress.add(processed=1, hashed=1, bytes=1000)
+    progress.add(processed=1, errors=1)
+    clock.now = 2
+    snap = progress.snapshot()
+    assert (snap["total"], snap["processed"], snap["hashed"], snap["errors"]) == (10, 3, 1, 1)
+    assert snap["files_per_s"] == 1.5
+    assert snap["bytes_per_s"] == 500
+
+def test_sinks_are_not_called_per_file():
+    calls = []
+    progress = ProgressTracker(interval=3600, sinks=[calls.append])
+    progress.start()
+    for _ in range(1000):
+        progress.add(processed=1)
+    assert calls == []
+    progress.stop()
+    assert len(calls) == 1
+    assert calls[0]["processed"] == 1000
+
+def test_ticker_publishes_periodically():
+    published = []
+    progress = ProgressTracker(interval=0.01, sinks=[published.append])
+    progress.start()
+    while len(published) < 3:
+        progress.add(processed=1)
+    progress.stop()
+
+def test_failing_sink_does_not_stop_others():
+    def broken(snap):
+        raise RuntimeError("boom")
+    calls = []
+    progress = ProgressTracker(sinks=[broken, calls.append])
+    progress.publish()
+    assert len(calls) == 1
+
+def test_tray_and_tqdm_sinks():
+    class Icon:
+        title = ""
+    class Bar:
+        total = n = 0
+        def refresh(self):
+            self.refreshed = True
+    icon, bar = Icon(), Bar()
+    progress = ProgressTracker(sinks=[tray_sink(icon), tqdm_sink(bar)])
+    progress.publish()
+    assert icon.title == "File Hasher: Initializing..."
+    progress.reset(total=4)
+    progress.add(processed=1)
+    progress.publish()
+    assert icon.title == "File Hasher: 1/4 files processed (25.00%)"
+    assert (bar.total, bar.n, bar.refreshed) == (4, 1, True)
+
+def test_meta_sink_feeds_stats(tmp_path):
+    db_path = str(tmp_path / "progress.db")
+    create_database(db_path)
+    progress = ProgressTracker(sinks=[meta_sink(db_path)])
+    progress.reset(total=5)
+    progress.add(processed=2, hashed=2, bytes=10)
+    progress.publish()
+    (key, snap, updated), = get_live_progress(db_path)
+    assert key == "progress"
+    assert snap["processed"] == 2 and snap["total"] == 5
+    assert updated is not None
+
+def test_service_progress_counts_hard_links(tmp_path, make_service):
+    import os
+    root = tmp_path / "data"
+    root.mkdir()
+    for i in range(3):
+        (root / f"f{i}.bin").write_bytes(b"data %d" % i)
+    for i, target in enumerate(["f0.bin", "f0.bin", "f1.bin", "f2.bin"]):
+        os.link(root / target, root / f"link{i}.bin")
+    service = make_service(root)
+    service.run_once()
+    snap = service.progress.snapshot()
+    assert (snap["processed"], snap["total"]) == (7, 7)
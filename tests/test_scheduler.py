@@ -0,0 +1,89 @@
+import os
+import hashlib
+
+import pytest
+
+from utils.database import get_file_info_from_db
+from utils.scheduler import Scheduler, WorkItem, make_scheduler
+
+def paths(items):
+    return [item.path for item in items]
+
+def test_changed_before_new_then_shortest():
+    items = [
+        WorkItem("new-big", 5000, 0, "new"),
+        WorkItem("new-small", 10, 0, "new"),
+        WorkItem("changed-big", 8000, 0, "changed"),
+    ]
+    regular, large = Scheduler().plan(items)
+    assert paths(regular) == ["changed-big", "new-small", "new-big"]
+    assert large == []
+
+def test_recent_first():
+    items = [WorkItem("old", 1, 100, "new"), WorkItem("recent", 1, 200, "new")]
+    regular, _ = Scheduler(["recent_first"]).plan(items)
+    assert paths(regular) == ["recent", "old"]
+
+def test_large_files_get_their_own_lane():
+    items = [WorkItem("huge", 100, 0, "changed"), WorkItem("small", 10, 0, "new")]
+    regular, large = Scheduler(large_file_threshold=100).plan(items)
+    assert paths(regular) == ["small"]
+    assert paths(large) == ["huge"]
+
+def test_root_weight_shortens_expected_time():
+    scheduler = Scheduler(["shortest_expected"], root_weights={"/hot": 100}, file_overhead=0)
+    items = [WorkItem("/cold/a", 10, 0, "new"), WorkItem("/hot/b", 500, 0, "new"), WorkItem("/hotter/c", 20, 0, "new")]
+    regular, _ = scheduler.plan(items)
+    assert paths(regular) == ["/hot/b", "/cold/a", "/hotter/c"]
+
+def test_most_specific_root_wins():
+    scheduler = Scheduler(root_weights={"/data": 2, "/data/critical/": 10})
+    assert scheduler.root_weight("/data/critical/x") == 10
+    assert scheduler.root_weight("/data/other/x") == 2
+    assert scheduler.root_weight("/elsewhere") == 1.0
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        Scheduler(["biggest_first"])
+
+def test_make_scheduler_reads_config():
+    scheduler = make_scheduler({"SCHEDULE_POLICIES": ["small_first"], "LARGE_FILE_THRESHOLD": 1024,
+                                "ROOT_WEIGHTS": {"/a": 3}}, throughput=1e6)
+    assert scheduler.policies == ("small_first",)
+    assert scheduler.large_file_threshold == 1024
+    assert scheduler.root_weight("/a/b") == 3
+    assert scheduler.throughput == 1e6
+
+def test_service_hashes_changed_files_first(tmp_path, make_service, monkeypatch):
+    import files_hashing
+    root = tmp_path / "data"
+    root.mkdir()
+    for name, size in (("a.bin", 300), ("b.bin", 10), ("c.bin", 5000)):
+        (root / name).write_bytes(b"x" * size)
+    service = make_service(root, LARGE_FILE_THRESHOLD=1000)
+    service.run_once()
+
+    (root / "a.bin").write_bytes(b"y" * 301)
+    (root / "d.bin").write_bytes(b"z" * 5)
+    os.utime(root / "c.bin", (1, 1))
+    calls = []
+    real_hash_file = files_hashing.hash_local_file
+    def recording_hash_file(path, algorithm):
+        calls.append(os.path.basename(path))
+        return real_hash_file(path, algorithm)
+    monkeypatch.setattr(files_hashing, "hash_local_file", recording_hash_file)
+    service.run_once()
+    # changed before new, the large-file lane last
+    assert calls == ["a.bin", "d.bin", "c.bin"]
+
+def test_service_engine_runs_large_lane(tmp_path, make_service):
+    root = tmp_path / "data"
+    root.mkdir()
+    contents = {"big.bin": b"b" * 4096, "small.bin": b"s", "mid.bin": b"m" * 100}
+    for name, data in contents.items():
+        (root / name).write_bytes(data)
+    service = make_service(root, HASH_ENGINE="thread", LARGE_FILE_THRESHOLD=1024)
+    service.run_once()
+    for name, data in contents.items():
+        assert get_file_info_from_db(service.db_path, str(root / name))[1] == hashlib.sha256(data).hexdigest()
+    assert service._throughput > 0
@@ -1,4 +1,6 @@
+import json
 import sqlite3
+import time
 
 def create_database(db_path):
     """Create the database and necessary tables if they don't exist."""
@@ -9,9 +11,14 @@ def create_database(db_path):
         path TEXT PRIMARY KEY,
         hash TEXT,
         size INTEGER,
-        last_modified INTEGER
+        last_modified INTEGER,
+        algorithm TEXT
     )
     ''')
+    if _ensure_column(c, "file_hashes", "algorithm", "TEXT"):
+        # rows written before the column existed were hashed by files_hashing.py, which
+        # always used sha256 (the local script could not run at the time)
+        c.execute("UPDATE file_hashes SET algorithm = 'sha256' WHERE algorithm IS NULL")
     c.execute('''
     CREATE TABLE IF NOT EXISTS zero_size_files (
         path TEXT PRIMARY KEY
@@ -28,17 +35,106 @@ def create_database(db_path):
     c.execute('''
     CREATE TABLE IF NOT EXISTS meta (
         key TEXT PRIMARY KEY,
-        value TEXT
+        value TEXT,
+        last_updated TEXT
     )
     ''')
+    _ensure_column(c, "meta", "last_updated", "TEXT")
+
+    # append-only log of every insert, hash change and deletion in file_hashes;
+    # AUTOINCREMENT keeps seq monotonic even after old entries are compacted away
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS change_journal (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        path TEXT NOT NULL,
+        op TEXT NOT NULL,
+        hash TEXT,
+        size INTEGER,
+        last_modified INTEGER,
+        algorithm TEXT,
+        ts INTEGER
+    )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS change_journal_path ON change_journal (path, seq)")
+
+    # directory index for incremental rescans: mtime and child names per directory
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS directories (
+        path TEXT PRIMARY KEY,
+        mtime INTEGER,
+        subdirs TEXT,
+        files TEXT
+    )
+    ''')
+
+    # work queue shared by the coordinator and any number of workers
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS jobs (
+        path TEXT PRIMARY KEY,
+        kind TEXT NOT NULL DEFAULT 'file',
+        state TEXT NOT NULL DEFAULT 'pending',
+        lease_owner TEXT,
+        lease_expires REAL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        error TEXT
+    )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, lease_expires)")
+
     conn.commit()
+    # WAL lets workers read while another process holds the write lock
+    # (the journal mode cannot change inside a transaction, so this goes last)
+    c.execute("PRAGMA journal_mode=WAL")
     conn.close()
 
+def _ensure_column(c, table, column, decl):
+    """Add a column to an existing table created by an older version. Returns True if added."""
+    c.execute(f"PRAGMA table_info({table})")
+    if column in [row[1] for row in c.fetchall()]:
+        return False
+    c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+    return True
+
+def _journal_hashes(c, hashes):
+    """Append insert/update entries for rows that are new or whose digest changed."""
+    entries = []
+    for path, digest, size, last_modified, algorithm in hashes:
+        c.execute("SELECT hash, algorithm FROM file_hashes WHERE path = ?", (path,))
+        old = c.fetchone()
+        if old == (digest, algorithm):
+            continue  # only the size/mtime were refreshed
+        op = "insert" if old is None else "update"
+        entries.append((path, op, digest, size, last_modified, algorithm))
+    c.executemany(
+        "INSERT INTO change_journal (path, op, hash, size, last_modified, algorithm, ts) "
+        "VALUES (?, ?, ?, ?, ?, ?, strftime('%s','now'))",
+        entries,
+    )
+
 def save_hashes_to_db(hashes, db_path):
-    """Save file hashes to the database."""
+    """Save (path, hash, size, last_modified, algorithm) rows to the database."""
     conn = sqlite3.connect(db_path)
     c = conn.cursor()
-    c.executemany("INSERT OR REPLACE INTO file_hashes (path, hash, size, last_modified) VALUES (?, ?, ?, ?)", hashes)
+    _journal_hashes(c, hashes)
+    c.executemany("INSERT OR REPLACE INTO file_hashes (path, hash, size, last_modified, algorithm) VALUES (?, ?, ?, ?, ?)", hashes)
+    conn.commit()
+    conn.close()
+
+def save_link_hashes(links, db_path):
+    """Copy the stored row of each primary path to its hard links.
+
+    `links` maps a hashed path to the other paths of the same inode.
+    """
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    hashes = []
+    for primary, aliases in links.items():
+        c.execute("SELECT hash, size, last_modified, algorithm FROM file_hashes WHERE path = ?", (primary,))
+        row = c.fetchone()
+        if row:
+            hashes.extend((alias,) + row for alias in aliases)
+    _journal_hashes(c, hashes)
+    c.executemany("INSERT OR REPLACE INTO file_hashes (path, hash, size, last_modified, algorithm) VALUES (?, ?, ?, ?, ?)", hashes)
     conn.commit()
     conn.close()
 
@@ -62,7 +158,7 @@ def get_file_info_from_db(db_path, file_path):
     """Get file information from the database."""
     conn = sqlite3.connect(db_path)
     c = conn.cursor()
-    c.execute("SELECT path, hash, size, last_modified FROM file_hashes WHERE path = ?", (file_path,))
+    c.execute("SELECT path, hash, size, last_modified, algorithm FROM file_hashes WHERE path = ?", (file_path,))
     result = c.fetchone()
     conn.close()
     return result
@@ -76,11 +172,28 @@ def get_all_files_from_db(db_path):
     conn.close()
     return [row[0] for row in rows]
 
+def get_files_under(db_path, prefix):
+    """Get the stored file paths that start with `prefix` (a directory path ending in a separator)."""
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute("SELECT path FROM file_hashes WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))
+    rows = c.fetchall()
+    conn.close()
+    return [row[0] for row in rows]
+
 def delete_file_from_db(files, db_path):
     """Delete files from the database that no longer exist on disk."""
     conn = sqlite3.connect(db_path)
     c = conn.cursor()
-    c.executemany("DELETE FROM file_hashes WHERE path = ?", [(file,) for file in files])
+    deleted = []
+    for file in files:
+        c.execute("DELETE FROM file_hashes WHERE path = ?", (file,))
+        if c.rowcount:
+            deleted.append((file,))
+    c.executemany(
+        "INSERT INTO change_journal (path, op, ts) VALUES (?, 'delete', strftime('%s','now'))",
+        deleted,
+    )
     conn.commit()
     conn.close()
 
@@ -90,9 +203,8 @@ def set_meta(db_path, key, value, ts=None):
     if ts is None:
         # let SQLite set last_updated
         conn.execute(
-            "INSERT INTO meta(key,value) VALUES(?, ?) "
-            "ON CONFLICT(key) DO UPDATE SET value=excluded.value, "
-            "last_updated=strftime('%Y-%m-%dT%H:%M:%fZ','now')",
+            "INSERT INTO meta(key,value,last_updated) VALUES(?, ?, strftime('%Y-%m-%dT%H:%M:%fZ','now')) "
+            "ON CONFLICT(key) DO UPDATE SET value=excluded.value, last_updated=excluded.last_updated",
             (key, value),
         )
     else:
@@ -103,4 +215,251 @@ def set_meta(db_path, key, value, ts=None):
             (key, value, ts),
         )
     conn.commit()
-    
+    conn.close()
+
+def get_meta(db_path, key, default=None):
+    conn = sqlite3.connect(db_path)
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    conn.close()
+    return row[0] if row else default
+
+def setdefault_meta(db_path, key, value):
+    """Store `value` unless `key` is already set; returns the stored value.
+
+    Atomic, so processes racing to set the same key all end up with one value.
+    """
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "INSERT OR IGNORE INTO meta(key,value,last_updated) "
+        "VALUES(?, ?, strftime('%Y-%m-%dT%H:%M:%fZ','now'))",
+        (key, value),
+    )
+    conn.commit()
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    conn.close()
+    return row[0]
+
+# ---------- Change journal ----------
+
+def get_changes_since(db_path, seq, limit=1000):
+    """Journal entries with a sequence number above `seq`, oldest first.
+
+    Each entry is (seq, path, op, hash, size, last_modified, algorithm, ts);
+    op is "insert", "update" or "delete".
+    """
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute(
+        "SELECT seq, path, op, hash, size, last_modified, algorithm, ts FROM change_journal "
+        "WHERE seq > ? ORDER BY seq LIMIT ?",
+        (seq, limit),
+    )
+    rows = c.fetchall()
+    conn.close()
+    return rows
+
+def get_journal_bounds(db_path):
+    """(first, last) sequence numbers in the journal, (None, None) if it is empty.
+
+    A consumer whose cursor is below first - 1 has missed compacted entries
+    and must resynchronise from file_hashes.
+    """
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute("SELECT MIN(seq), MAX(seq) FROM change_journal")
+    bounds = c.fetchone()
+    conn.close()
+    return bounds
+
+def compact_journal(db_path, max_rows):
+    """Keep the journal bounded. Returns the number of entries removed.
+
+    Entries superseded by a later entry for the same path are dropped first
+    (a consumer reading past them still sees the final state), then the
+    oldest entries beyond `max_rows`.
+    """
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute(
+        "DELETE FROM change_journal WHERE EXISTS ("
+        "SELECT 1 FROM change_journal AS later "
+        "WHERE later.path = change_journal.path AND later.seq > change_journal.seq)"
+    )
+    removed = c.rowcount
+    c.execute(
+        "DELETE FROM change_journal WHERE seq <= (SELECT MAX(seq) FROM change_journal) - ?",
+        (max_rows,),
+    )
+    removed += c.rowcount
+    conn.commit()
+    conn.close()
+    return removed
+
+
+# ---------- Directory index (incremental rescans) ----------
+
+def load_directory_index(db_path, root, prefix):
+    """Load {path: (mtime, subdirs, files)} for `root` and every directory starting with `prefix`."""
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute(
+        "SELECT path, mtime, subdirs, files FROM directories "
+        "WHERE path = ? OR substr(path, 1, ?) = ?",
+        (root, len(prefix), prefix),
+    )
+    index = {
+        path: (mtime, json.loads(subdirs), json.loads(files))
+        for path, mtime, subdirs, files in c.fetchall()
+    }
+    conn.close()
+    return index
+
+def save_directory_index(updates, removed, db_path):
+    """Store {path: (mtime, subdirs, files)} rows and drop the `removed` directories."""
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.executemany(
+        "INSERT OR REPLACE INTO directories (path, mtime, subdirs, files) VALUES (?, ?, ?, ?)",
+        [(path, mtime, json.dumps(subdirs), json.dumps(files))
+         for path, (mtime, subdirs, files) in updates.items()],
+    )
+    c.executemany("DELETE FROM directories WHERE path = ?", [(path,) for path in removed])
+    conn.commit()
+    conn.close()
+
+
+# ---------- Job table (coordinator/worker mode) ----------
+
+def enqueue_jobs(jobs, db_path):
+    """Queue (path, kind) jobs; finished jobs are reset, live ones are left alone."""
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.executemany(
+        "INSERT INTO jobs (path, kind) VALUES (?, ?) "
+        "ON CONFLICT(path) DO UPDATE SET kind=excluded.kind, state='pending', "
+        "lease_owner=NULL, lease_expires=NULL, attempts=0, error=NULL "
+        "WHERE jobs.state IN ('done', 'failed')",
+        jobs,
+    )
+    conn.commit()
+    conn.close()
+
+def claim_jobs(db_path, worker_id, limit=1, lease_seconds=600, now=None):
+    """Lease up to `limit` pending (or expired) jobs to `worker_id`.
+
+    Returns a list of (path, kind, attempts). Directory jobs are handed out first so
+    that discovery keeps ahead of hashing.
+    """
+    if now is None:
+        now = time.time()
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    c = conn.cursor()
+    try:
+        # take the write lock up front so two workers never lease the same row
+        c.execute("BEGIN IMMEDIATE")
+        c.execute(
+            "SELECT path, kind, attempts + 1 FROM jobs "
+            "WHERE state = 'pending' OR (state = 'leased' AND lease_expires < ?) "
+            "ORDER BY kind != 'dir', rowid LIMIT ?",
+            (now, limit),
+        )
+        rows = c.fetchall()
+        c.executemany(
+            "UPDATE jobs SET state='leased', lease_owner=?, lease_expires=?, "
+            "attempts=attempts + 1 WHERE path = ?",
+            [(worker_id, now + lease_seconds, path) for path, _, _ in rows],
+        )
+        c.execute("COMMIT")
+    except Exception:
+        c.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return rows
+
+def renew_leases(db_path, worker_id, paths, lease_seconds=600, now=None):
+    """Extend the leases `worker_id` still holds on `paths`."""
+    if now is None:
+        now = time.time()
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.executemany(
+        "UPDATE jobs SET lease_expires=? WHERE path = ? AND lease_owner = ? AND state = 'leased'",
+        [(now + lease_seconds, path, worker_id) for path in paths],
+    )
+    conn.commit()
+    conn.close()
+
+def complete_jobs(db_path, worker_id, paths):
+    """Mark jobs done; ignored for jobs whose lease was taken over by another worker."""
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.executemany(
+        "UPDATE jobs SET state='done', lease_owner=NULL, lease_expires=NULL, error=NULL "
+        "WHERE path = ? AND lease_owner = ?",
+        [(path, worker_id) for path in paths],
+    )
+    conn.commit()
+    conn.close()
+
+def fail_jobs(db_path, worker_id, failures):
+    """Mark (path, error) jobs as failed."""
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.executemany(
+        "UPDATE jobs SET state='failed', lease_owner=NULL, lease_expires=NULL, error=? "
+        "WHERE path = ? AND lease_owner = ?",
+        [(error, path, worker_id) for path, error in failures],
+    )
+    conn.commit()
+    conn.close()
+
+def release_jobs(db_path, worker_id, paths):
+    """Hand leased jobs back to the queue (e.g. after a connection drop)."""
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.executemany(
+        "UPDATE jobs SET state='pending', lease_owner=NULL, lease_expires=NULL "
+        "WHERE path = ? AND lease_owner = ? AND state = 'leased'",
+        [(path, worker_id) for path in paths],
+    )
+    conn.commit()
+    conn.close()
+
+def reclaim_expired_leases(db_path, now=None):
+    """Return jobs whose lease expired (dead worker) to the queue. Returns the count."""
+    if now is None:
+        now = time.time()
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute(
+        "UPDATE jobs SET state='pending', lease_owner=NULL, lease_expires=NULL "
+        "WHERE state = 'leased' AND lease_expires < ?",
+        (now,),
+    )
+    count = c.rowcount
+    conn.commit()
+    conn.close()
+    return count
+
+def prune_jobs(db_path):
+    """Drop finished (done or failed) jobs, e.g. before a new pass is queued. Returns the count."""
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute("DELETE FROM jobs WHERE state IN ('done', 'failed')")
+    count = c.rowcount
+    conn.commit()
+    conn.close()
+    return count
+
+def count_jobs(db_path, kind=None):
+    """Return a {state: count} dict for the job table, optionally for one kind of job."""
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    if kind is None:
+        c.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state")
+    else:
+        c.execute("SELECT state, COUNT(*) FROM jobs WHERE kind = ? GROUP BY state", (kind,))
+    rows = c.fetchall()
+    conn.close()
+    return dict(rows)
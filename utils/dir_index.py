@@ -0,0 +1,79 @@
+import time
+import logging
+
+from utils.database import load_directory_index, save_directory_index
+
+logger = logging.getLogger(__name__)
+
+class DirectoryIndex:
+    """Incremental tree walks backed by the `directories` table.
+
+    Adding, removing or renaming a file bumps its parent directory's mtime,
+    so only directories whose mtime changed since the last scan are listed;
+    unchanged ones are descended into from the stored child names, which
+    costs one stat per directory. In-place modifications do not touch the
+    directory mtime, so callers still run a periodic full scan.
+
+    Changes are kept in memory until commit(), so a pass that fails half way
+    lists the same directories again on the retry.
+    """
+
+    def __init__(self, backend, db_path):
+        self.backend = backend
+        self.db_path = db_path
+        self._updates = {}
+        self._gone = []
+
+    def scan(self, root, full=False):
+        """Walk `root`; `full=True` lists every directory again.
+
+        Returns:
+            (files, removed): files in listed directories (to be checked) and
+            files that disappeared since the last scan.
+        """
+        join = self.backend.join
+        scan_start = int(time.time())
+        index = load_directory_index(self.db_path, root, join(root, ""))
+        files, removed = [], []
+        stack = [root]
+        while stack:
+            path = stack.pop()
+            entry = index.pop(path, None)
+            try:
+                _, mtime = self.backend.stat(path)
+                if not full and entry and entry[0] == mtime:
+                    stack.extend(join(path, name) for name in entry[1])
+                    continue
+                subdirs, names = self.backend.list_dir(path)
+            except FileNotFoundError:
+                if entry:
+                    self._gone.append(path)
+                    removed.extend(join(path, name) for name in entry[2])
+                continue
+            except OSError as e:
+                # e.g. "System Volume Information": skip it like os.walk does, keeping
+                # what the index knew about it (and its subdirectories) for next time
+                logger.warning("Cannot list %s: %s", path, e)
+                if entry:
+                    stack.extend(join(path, name) for name in entry[1])
+                continue
+
+            files.extend(join(path, name) for name in names)
+            if entry:
+                current = set(names)
+                removed.extend(join(path, name) for name in entry[2] if name not in current)
+            # a change later in the same second would not move the mtime: list it again next time
+            self._updates[path] = (mtime if mtime < scan_start - 1 else None, subdirs, names)
+            stack.extend(join(path, name) for name in subdirs)
+
+        # directories left in the index were not reached: they are gone
+        for path, (_, _, names) in index.items():
+            self._gone.append(path)
+            removed.extend(join(path, name) for name in names)
+        return files, removed
+
+    def commit(self):
+        """Persist the scanned directories once their files have been processed."""
+        save_directory_index(self._updates, self._gone, self.db_path)
+        self._updates = {}
+        self._gone = []
@@ -0,0 +1,59 @@
+import os
+import logging
+
+from utils.database import delete_file_from_db
+from utils.event_queue import DELETED
+
+logger = logging.getLogger(__name__)
+
+class QueueingEventHandler:
+    """watchdog callbacks that only queue events for the event worker.
+
+    Mixed in ahead of watchdog's FileSystemEventHandler, so the observer
+    thread never touches the disk or the database.
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.queue.push(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.queue.push(event.src_path)
+
+    def on_deleted(self, event):
+        if not event.is_directory:
+            self.queue.push(event.src_path, DELETED)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.queue.push_move(event.src_path, event.dest_path)
+        else:
+            # the event worker expands the directory; entries under the old
+            # one are removed by the next full scan
+            self.queue.push(event.dest_path)
+
+def handle_ready_events(queue, db_path, process_files, backend, max_items=None):
+    """One round of the event worker: apply settled deletes and hand the changed
+    files, with moved-in directories expanded, to `process_files(files, db_path)`.
+
+    Errors are logged rather than raised, so the worker thread survives them;
+    the next full scan picks up whatever was missed.
+    """
+    changed, deleted = queue.pop_ready(max_items)
+    try:
+        if deleted:
+            delete_file_from_db(deleted, db_path)
+        files = []
+        for path in changed:
+            if os.path.isdir(path):
+                files.extend(backend.list_files(path))
+            else:
+                files.append(path)
+        if files:
+            process_files(files, db_path)
+    except Exception:
+        logger.exception("Failed to handle file system events")
@@ -0,0 +1,63 @@
+import time
+import threading
+
+CHANGED = "changed"
+DELETED = "deleted"
+
+class DebouncedEventQueue:
+    """Deduplicating queue of filesystem events with a per-path quiet period.
+
+    Every event on a path replaces the previous one and restarts its timer, so
+    a file that is still being written only comes out once it has been quiet
+    for `quiet_period` seconds, and then only once. The last event wins: a file
+    created and deleted within the quiet period comes out as deleted.
+    """
+
+    def __init__(self, quiet_period=2.0, clock=time.monotonic):
+        self.quiet_period = quiet_period
+        self.clock = clock
+        self._pending = {}  # path -> (kind, time of last event)
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._pending)
+
+    def push(self, path, kind=CHANGED):
+        with self._cond:
+            # re-insert so the dict stays ordered by last event time
+            self._pending.pop(path, None)
+            self._pending[path] = (kind, self.clock())
+            self._cond.notify()
+
+    def push_move(self, src_path, dest_path):
+        self.push(src_path, DELETED)
+        self.push(dest_path, CHANGED)
+
+    def pop_ready(self, max_items=None):
+        """Remove and return (changed, deleted) paths that have been quiet long enough."""
+        changed, deleted = [], []
+        with self._cond:
+            deadline = self.clock() - self.quiet_period
+            for path, (kind, last_event) in list(self._pending.items()):
+                if last_event > deadline:
+                    break  # ordered by last event, the rest is newer
+                if max_items is not None and len(changed) + len(deleted) >= max_items:
+                    break
+                del self._pending[path]
+                (deleted if kind == DELETED else changed).append(path)
+        return changed, deleted
+
+    def wait(self, timeout=None):
+        """Block until the oldest pending path is due (or `timeout` passes)."""
+        with self._cond:
+            if not self._pending:
+                self._cond.wait(timeout)
+            if not self._pending:
+                return
+            _, last_event = next(iter(self._pending.values()))
+            delay = last_event + self.quiet_period - self.clock()
+            if timeout is not None:
+                delay = min(delay, timeout)
+        if delay > 0:
+            time.sleep(delay)
@@ -1,11 +1,21 @@
 
 import os
+import posixpath
+from stat import S_ISDIR
+
 import paramiko
 
 class FileBackend:
     def list_files(self, root):
         raise NotImplementedError
 
+    def list_dir(self, path):
+        """Return (subdirectory names, file names) directly under `path`."""
+        raise NotImplementedError
+
+    def join(self, *parts):
+        return posixpath.join(*parts)
+
     def stat(self, file_path):
         raise NotImplementedError
 
@@ -27,6 +37,46 @@ class LocalFileBackend(FileBackend):
             for fname in filenames:
                 yield os.path.join(dirpath, fname)
 
+    def list_dir(self, path):
+        subdirs, files = [], []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    # like os.walk: symlinked directories are not followed
+                    if not entry.is_symlink():
+                        subdirs.append(entry.name)
+                else:
+                    files.append(entry.name)
+        return subdirs, files
+
+    def join(self, *parts):
+        return os.path.join(*parts)
+
+    def list_unique_files(self, root):
+        """Yield (path, links) once per inode under `root`."""
+        return self.group_by_inode(self.list_files(root))
+
+    def group_by_inode(self, paths):
+        """Yield (path, links) once per inode.
+
+        `links` are the other hard links to the same (st_dev, st_ino), so the
+        caller hashes `path` once and reuses the digest for them. Files with a
+        single link are yielded as they are found; multi-link inodes at the end.
+        """
+        inodes = {}
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                yield path, []
+                continue
+            if st.st_nlink <= 1:
+                yield path, []
+            else:
+                inodes.setdefault((st.st_dev, st.st_ino), []).append(path)
+        for paths in inodes.values():
+            yield paths[0], paths[1:]
+
     def stat(self, file_path):
         st = os.stat(file_path)
         return st.st_size, int(st.st_mtime)
@@ -59,8 +109,6 @@ class SFTPFileBackend(FileBackend):
             self.transport = None
 
     def list_files(self, root):
-        import posixpath
-        from stat import S_ISDIR
         for entry in self.sftp.listdir_attr(root):
             path = posixpath.join(root, entry.filename)
             if S_ISDIR(entry.st_mode):
@@ -68,6 +116,12 @@ class SFTPFileBackend(FileBackend):
             else:
                 yield path
 
+    def list_dir(self, path):
+        subdirs, files = [], []
+        for entry in self.sftp.listdir_attr(path):
+            (subdirs if S_ISDIR(entry.st_mode) else files).append(entry.filename)
+        return subdirs, files
+
     def stat(self, file_path):
         st = self.sftp.stat(file_path)
         return st.st_size, int(st.st_mtime)
@@ -96,3 +150,13 @@ class SFTPFileBackend(FileBackend):
     
         err_text = "\n".join(f"{algo}: {msg}" for algo, msg in errors.items())
         raise ValueError(f"Failed to load private key '{path}' with any supported algorithm.\nTried:\n{err_text}")
+
+
+def make_backend(config):
+    """Build the backend selected by the BACKEND config key ("sftp" or "local")."""
+    name = (config.get("BACKEND") or "sftp").lower()
+    if name == "local":
+        return LocalFileBackend()
+    if name == "sftp":
+        return SFTPFileBackend(config)
+    raise ValueError(f"Unknown BACKEND '{name}' (expected 'sftp' or 'local')")
@@ -1,11 +1,107 @@
 import hashlib
+import time
+
+from utils.database import get_meta, set_meta, setdefault_meta
+
+# xxhash is optional: non-cryptographic, but far faster than disk on any CPU
+try:
+    import xxhash
+except ImportError:  # pragma: no cover
+    xxhash = None
+
+# "none": change detection only; "crypto": collision resistant
+SECURITY_LEVELS = {"none": 0, "crypto": 1}
+
+# name -> (factory, security level)
+HASHERS = {}
+
+def register_hasher(name, factory, security):
+    """Register a hasher factory (returning an object with update()/hexdigest())."""
+    if security not in SECURITY_LEVELS:
+        raise ValueError(f"Unknown security level '{security}'")
+    HASHERS[name] = (factory, security)
+
+for _name in ("md5", "sha1"):
+    register_hasher(_name, lambda _name=_name: hashlib.new(_name), "none")
+for _name in ("sha256", "sha512", "sha3_256", "blake2b", "blake2s"):
+    register_hasher(_name, lambda _name=_name: hashlib.new(_name), "crypto")
+if xxhash is not None:
+    register_hasher("xxh64", xxhash.xxh64, "none")
+    register_hasher("xxh3_64", xxhash.xxh3_64, "none")
+    register_hasher("xxh128", xxhash.xxh3_128, "none")
+
+def new_hasher(algorithm):
+    """Create a hasher from the registry, falling back to hashlib for other names."""
+    if algorithm in HASHERS:
+        return HASHERS[algorithm][0]()
+    return hashlib.new(algorithm)
+
+def available_algorithms(security="none"):
+    """Names of registered hashers that meet the given security level."""
+    required = SECURITY_LEVELS[security]
+    return [name for name, (_, level) in HASHERS.items() if SECURITY_LEVELS[level] >= required]
+
+def benchmark_algorithms(algorithms, sample_size=4 * 1024 * 1024, rounds=3):
+    """Measure in-memory throughput (bytes/s, best of `rounds`) for each algorithm."""
+    sample = bytes(range(256)) * (sample_size // 256)
+    results = {}
+    for name in algorithms:
+        best = None
+        for _ in range(rounds):
+            start = time.perf_counter()
+            hasher = new_hasher(name)
+            hasher.update(sample)
+            hasher.hexdigest()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = len(sample) / best if best else float("inf")
+    return results
+
+def select_algorithm(security="crypto", sample_size=4 * 1024 * 1024):
+    """Pick the fastest registered algorithm that meets `security`."""
+    results = benchmark_algorithms(available_algorithms(security), sample_size)
+    return max(results, key=results.get)
+
+def resolve_algorithm(config, default="auto"):
+    """Algorithm from HASH_ALGORITHM; "auto" benchmarks against HASH_SECURITY."""
+    algorithm = config.get("HASH_ALGORITHM") or default
+    if algorithm == "auto":
+        return select_algorithm(config.get("HASH_SECURITY") or "crypto")
+    new_hasher(algorithm)  # fail fast on unknown names
+    return algorithm
+
+def resolve_stored_algorithm(config, db_path):
+    """Like resolve_algorithm, but "auto" reuses the choice recorded in the meta table.
+
+    Every worker, restart and entry point sharing `db_path` hashes with the
+    same algorithm; only the first process runs the benchmark. An explicit
+    HASH_ALGORITHM replaces the recorded choice.
+    """
+    if (config.get("HASH_ALGORITHM") or "auto") != "auto":
+        algorithm = resolve_algorithm(config)
+        set_meta(db_path, "hash_algorithm", algorithm)
+        return algorithm
+    stored = get_meta(db_path, "hash_algorithm")
+    if stored in available_algorithms(config.get("HASH_SECURITY") or "crypto"):
+        return stored
+    if stored is None:
+        return setdefault_meta(db_path, "hash_algorithm", resolve_algorithm(config))
+    if stored not in HASHERS:
+        raise ValueError(
+            f"The database hashes with '{stored}', which is not available here "
+            f"(install xxhash or set HASH_ALGORITHM)"
+        )
+    # HASH_SECURITY was raised above the recorded choice: pick again for the whole database
+    algorithm = resolve_algorithm(config)
+    set_meta(db_path, "hash_algorithm", algorithm)
+    return algorithm
 
 def hash_file(backend, file_path, algorithm: str = "md5", chunk_size: int = 4096):
     """Compute a file hash using any backend 
     Args:
         backend: FileBackend instance (LocalFileBackend, SFTPFileBackend, etc.)
         file_path: path to the file (string)
-        algorithm: hashing algorithm (md5, sha1, sha256, ...)
+        algorithm: hashing algorithm (md5, sha256, blake2b, xxh3_64, ... see HASHERS)
         chunk_size: size of chunks to read at once (bytes)
     
     Returns:
@@ -14,7 +110,7 @@ def hash_file(backend, file_path, algorithm: str = "md5", chunk_size: int = 4096
         If failure: (None, str(error))
     """
     try:
-        hasher = hashlib.new(algorithm)
+        hasher = new_hasher(algorithm)
         with backend.open(file_path, "rb") as f:
             while chunk := f.read(chunk_size):
                 hasher.update(chunk)
@@ -0,0 +1,380 @@
+import os
+import mmap
+import ctypes
+import errno
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial, lru_cache
+
+from utils.hash_file import new_hasher
+
+ENGINE_MODES = ("serial", "thread", "process")
+# normal: regular cached reads; fadvise: drop pages right after hashing them;
+# direct: O_DIRECT reads that bypass the page cache (falls back to fadvise)
+CACHE_MODES = ("normal", "fadvise", "direct")
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024          # readinto buffer, reused per thread
+# mmap is opt-in: touching a page past the end of a file truncated while it is being
+# hashed raises SIGBUS, which Python cannot catch, and the whole process dies
+DEFAULT_MMAP_THRESHOLD = 0
+MMAP_STEP = 16 * 1024 * 1024               # slice fed to the hasher per update()
+
+_buffers = threading.local()
+
+def _get_buffer(size):
+    """Per-thread preallocated buffer, so hashing never allocates per chunk."""
+    view = getattr(_buffers, "view", None)
+    if view is None or len(view) != size:
+        view = _buffers.view = memoryview(bytearray(size))
+    return view
+
+def _get_aligned_buffer(size):
+    """Per-thread page-aligned buffer (anonymous mmap) for O_DIRECT reads."""
+    buf = getattr(_buffers, "aligned", None)
+    if buf is None or len(buf) != size:
+        buf = _buffers.aligned = mmap.mmap(-1, size)
+    return buf
+
+def _hash_direct(file_path, hasher, chunk_size):
+    """Feed the file to `hasher` with O_DIRECT reads. Returns False if O_DIRECT is unsupported."""
+    if not hasattr(os, "O_DIRECT"):
+        return False
+    try:
+        fd = os.open(file_path, os.O_RDONLY | os.O_DIRECT)
+    except OSError as e:
+        if e.errno == errno.EINVAL:  # e.g. tmpfs
+            return False
+        raise
+    try:
+        # O_DIRECT wants buffer, offset and length aligned to the block size
+        size = -(-chunk_size // mmap.PAGESIZE) * mmap.PAGESIZE
+        buf = _get_aligned_buffer(size)
+        try:
+            n = os.readv(fd, [buf])
+        except OSError as e:
+            if e.errno == errno.EINVAL:  # filesystem accepted the flag but not the read
+                return False
+            raise
+        with memoryview(buf) as view:
+            while n:
+                hasher.update(view[:n])
+                if n < size:
+                    break
+                n = os.readv(fd, [buf])
+    finally:
+        os.close(fd)
+    return True
+
+class _PageResidency:
+    """Which pages of an open file are in the page cache, via mincore().
+
+    The file is mapped only to hand its address range to mincore(); the
+    mapping is never read, so a concurrent truncation cannot fault.
+    """
+
+    def __init__(self, fd, size):
+        self._mincore = _libc_mincore()
+        self._mm = None
+        if self._mincore is not None and size:
+            try:
+                # a private mapping is writable, which ctypes needs to take its address
+                self._mm = mmap.mmap(fd, size, access=mmap.ACCESS_COPY)
+            except (OSError, ValueError):
+                self._mm = None
+        if self._mm is not None:
+            self._anchor = ctypes.c_char.from_buffer(self._mm)
+            self._base = ctypes.addressof(self._anchor)
+
+    @property
+    def available(self):
+        return self._mm is not None
+
+    def disable_readahead(self, fd):
+        """Stop kernel readahead on `fd`, so pages ahead of the current read only
+        look cached when something else put them there. Reads stay chunk sized."""
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_RANDOM if self.available else os.POSIX_FADV_SEQUENTIAL)
+
+    def resident(self, offset, length):
+        """One flag per page covering [offset, offset + length), or None if unknown."""
+        if self._mm is None:
+            return None
+        start = offset - offset % mmap.PAGESIZE
+        end = min(offset + length, len(self._mm))
+        if end <= start:
+            return b""
+        vec = (ctypes.c_ubyte * -(-(end - start) // mmap.PAGESIZE))()
+        if self._mincore(self._base + start, end - start, vec) != 0:
+            return None
+        return bytes(vec)
+
+    def close(self):
+        if self._mm is not None:
+            del self._anchor
+            self._mm.close()
+            self._mm = None
+
+def _drop_new_pages(fd, offset, length, was_resident):
+    """DONTNEED the pages of [offset, offset + length) that were not cached before the read.
+
+    Pages other applications already had in the cache stay there; without
+    mincore() (`was_resident` None) the whole range is dropped.
+    """
+    if was_resident is None:
+        os.posix_fadvise(fd, offset, length, os.POSIX_FADV_DONTNEED)
+        return
+    end = offset + length
+    base = offset - offset % mmap.PAGESIZE
+    run = None  # start of the current run of newly read pages
+    for i, flag in enumerate(was_resident):
+        page = base + i * mmap.PAGESIZE
+        if page >= end:
+            break
+        if not flag & 1:
+            if run is None:
+                run = max(page, offset)
+        elif run is not None:
+            os.posix_fadvise(fd, run, page - run, os.POSIX_FADV_DONTNEED)
+            run = None
+    if run is not None:
+        os.posix_fadvise(fd, run, end - run, os.POSIX_FADV_DONTNEED)
+
+def _hash_fadvise(f, hasher, chunk_size):
+    """Read sequentially and drop the pages this read brought into the cache."""
+    fd = f.fileno()
+    residency = _PageResidency(fd, os.fstat(fd).st_size)
+    residency.disable_readahead(fd)
+    try:
+        view = _get_buffer(chunk_size)
+        offset = 0
+        while True:
+            was_resident = residency.resident(offset, chunk_size)
+            n = f.readinto(view)
+            if not n:
+                break
+            hasher.update(view[:n])
+            _drop_new_pages(fd, offset, n, was_resident)
+            offset += n
+    finally:
+        residency.close()
+
+def _is_sparse(st):
+    """True if the file has holes (fewer allocated blocks than its size needs)."""
+    blocks = getattr(st, "st_blocks", None)
+    return blocks is not None and hasattr(os, "SEEK_DATA") and blocks * 512 < st.st_size
+
+def _hash_sparse(f, hasher, size, chunk_size, drop_cache=False):
+    """Hash a sparse file reading only its data extents.
+
+    Holes are fed to the hasher as zeros, so the digest equals a full read.
+    """
+    drop_cache = drop_cache and hasattr(os, "posix_fadvise")
+    fd = f.fileno()
+    residency = _PageResidency(fd, size) if drop_cache else None
+    if residency is not None:
+        residency.disable_readahead(fd)
+    try:
+        _hash_extents(f, hasher, size, chunk_size, residency)
+    finally:
+        if residency is not None:
+            residency.close()
+
+def _hash_extents(f, hasher, size, chunk_size, residency):
+    fd = f.fileno()
+    view = _get_buffer(chunk_size)
+    zeros = memoryview(bytes(chunk_size))
+    offset = 0
+    while offset < size:
+        try:
+            data = os.lseek(fd, offset, os.SEEK_DATA)
+        except OSError as e:
+            if e.errno != errno.ENXIO:
+                raise
+            data = size  # only a hole is left
+        data = min(data, size)
+        while offset < data:
+            step = min(chunk_size, data - offset)
+            hasher.update(zeros[:step])
+            offset += step
+        if offset >= size:
+            break
+        hole = min(os.lseek(fd, data, os.SEEK_HOLE), size)
+        f.seek(data)
+        while offset < hole:
+            step = min(chunk_size, hole - offset)
+            was_resident = residency.resident(offset, step) if residency is not None else None
+            n = f.readinto(view[:step])
+            if not n:
+                raise OSError(f"{f.name}: file shrank while hashing")
+            hasher.update(view[:n])
+            if residency is not None:
+                _drop_new_pages(fd, offset, n, was_resident)
+            offset += n
+
+def hash_local_file(file_path, algorithm="md5", chunk_size=DEFAULT_CHUNK_SIZE,
+                    mmap_threshold=DEFAULT_MMAP_THRESHOLD, cache_mode="normal"):
+    """Hash a local file without per-chunk allocations.
+
+    Files are read with readinto() into a reused buffer; reads and hashlib
+    both release the GIL for large buffers, so this scales on threads.
+    A non-zero `mmap_threshold` maps files of at least that many bytes
+    instead; only use it on trees whose files are never truncated while
+    being hashed (see DEFAULT_MMAP_THRESHOLD).
+
+    cache_mode "fadvise" and "direct" keep a full-tree pass from evicting
+    other applications' pages; "fadvise" checks with mincore() which pages
+    were cached before each read and drops only the ones it brought in.
+
+    Sparse files skip reading their holes (SEEK_DATA/SEEK_HOLE) and hash
+    zeros in their place, giving the same digest as a full read.
+
+    Returns:
+        (hex_digest, error_message) like utils.hash_file.hash_file
+    """
+    try:
+        hasher = new_hasher(algorithm)
+        if cache_mode == "direct" and _hash_direct(file_path, hasher, chunk_size):
+            return hasher.hexdigest(), None
+        with open(file_path, "rb", buffering=0) as f:
+            st = os.fstat(f.fileno())
+            if _is_sparse(st):
+                _hash_sparse(f, hasher, st.st_size, chunk_size, drop_cache=cache_mode != "normal")
+                return hasher.hexdigest(), None
+            if cache_mode != "normal" and hasattr(os, "posix_fadvise"):
+                _hash_fadvise(f, hasher, chunk_size)
+                return hasher.hexdigest(), None
+            size = st.st_size
+            if size and mmap_threshold and size >= mmap_threshold:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if hasattr(mm, "madvise"):
+                        mm.madvise(mmap.MADV_SEQUENTIAL)
+                    with memoryview(mm) as view:
+                        for offset in range(0, len(view), MMAP_STEP):
+                            hasher.update(view[offset:offset + MMAP_STEP])
+            else:
+                view = _get_buffer(chunk_size)
+                while n := f.readinto(view):
+                    hasher.update(view[:n])
+        return hasher.hexdigest(), None
+    except Exception as e:
+        return None, str(e)
+
+def _hash_one(file_path, algorithm, chunk_size, mmap_threshold, cache_mode):
+    digest, err = hash_local_file(file_path, algorithm, chunk_size, mmap_threshold, cache_mode)
+    return file_path, digest, err
+
+class LocalHashingEngine:
+    """Hash many local files at once on a thread or process pool.
+
+    mode:
+        "serial"  – hash in the calling thread
+        "thread"  – thread pool; hashlib drops the GIL while hashing big buffers
+        "process" – process pool; also parallelises small files and xxhash
+    """
+
+    def __init__(self, algorithm="md5", mode="thread", workers=None,
+                 chunk_size=DEFAULT_CHUNK_SIZE, mmap_threshold=DEFAULT_MMAP_THRESHOLD,
+                 cache_mode="normal"):
+        if mode not in ENGINE_MODES:
+            raise ValueError(f"Unknown engine mode '{mode}' (expected one of {', '.join(ENGINE_MODES)})")
+        if cache_mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode '{cache_mode}' (expected one of {', '.join(CACHE_MODES)})")
+        self.algorithm = algorithm
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.mmap_threshold = mmap_threshold
+        self.cache_mode = cache_mode
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.mode == "thread":
+                self._executor = ThreadPoolExecutor(self.workers)
+            elif self.mode == "process":
+                self._executor = ProcessPoolExecutor(self.workers)
+        return self._executor
+
+    def hash_file(self, file_path):
+        """Hash one file in the calling thread. Returns (digest, error)."""
+        return hash_local_file(file_path, self.algorithm, self.chunk_size, self.mmap_threshold,
+                               self.cache_mode)
+
+    def hash_files(self, paths):
+        """Hash `paths`, yielding (path, digest, error) in input order."""
+        func = partial(_hash_one, algorithm=self.algorithm, chunk_size=self.chunk_size,
+                       mmap_threshold=self.mmap_threshold, cache_mode=self.cache_mode)
+        if self.mode == "serial":
+            return map(func, paths)
+        chunksize = 16 if self.mode == "process" else 1
+        return self._get_executor().map(func, paths, chunksize=chunksize)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+def make_engine(config, algorithm):
+    """Engine selected by HASH_ENGINE, or None to hash through the backend."""
+    mode = config.get("HASH_ENGINE") or "backend"
+    if mode == "backend":
+        return None
+    return LocalHashingEngine(
+        algorithm,
+        mode,
+        workers=config.get("HASH_WORKERS"),
+        chunk_size=int(config.get("HASH_CHUNK_SIZE", DEFAULT_CHUNK_SIZE)),
+        mmap_threshold=int(config.get("MMAP_THRESHOLD", DEFAULT_MMAP_THRESHOLD)),
+        cache_mode=config.get("CACHE_MODE") or "normal",
+    )
+
+# ---------- Page cache inspection ----------
+
+@lru_cache(maxsize=None)
+def _libc_mincore():
+    try:
+        mincore = ctypes.CDLL(None, use_errno=True).mincore
+    except (OSError, AttributeError):
+        return None
+    mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.POINTER(ctypes.c_ubyte)]
+    mincore.restype = ctypes.c_int
+    return mincore
+
+def cached_bytes(file_path):
+    """Bytes of `file_path` currently in the page cache, or None if mincore() is unavailable."""
+    mincore = _libc_mincore()
+    if mincore is None:
+        return None
+    with open(file_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return 0
+        # a private mapping is writable, which ctypes needs to take its address
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY) as mm:
+            pages = -(-size // mmap.PAGESIZE)
+            vec = (ctypes.c_ubyte * pages)()
+            anchor = ctypes.c_char.from_buffer(mm)
+            try:
+                rc = mincore(ctypes.addressof(anchor), size, vec)
+            finally:
+                del anchor
+            if rc != 0:
+                return None
+    # only bit 0 (resident) is defined
+    resident = pages - bytes(vec).count(0)
+    return min(resident * mmap.PAGESIZE, size)
+
+def evict_from_page_cache(file_path):
+    """Ask the kernel to drop the clean cached pages of `file_path`."""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
@@ -0,0 +1,129 @@
+import json
+import time
+import logging
+import threading
+
+from utils.database import set_meta
+
+logger = logging.getLogger(__name__)
+
+class ProgressTracker:
+    """Progress counters for the hot path, published at a fixed rate.
+
+    add() only bumps counters under a lock; a background ticker hands a
+    snapshot to every sink once per `interval` seconds (and once more on
+    stop()), so the per-file cost does not depend on how progress is shown.
+    """
+
+    def __init__(self, interval=1.0, sinks=(), clock=time.monotonic):
+        self.interval = interval
+        self.clock = clock
+        self._sinks = list(sinks)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.reset()
+
+    def reset(self, total=0):
+        """Start a new pass."""
+        with self._lock:
+            self._total = total
+            self._processed = 0
+            self._hashed = 0
+            self._bytes = 0
+            self._errors = 0
+            self._started = self.clock()
+
+    def add(self, processed=0, hashed=0, bytes=0, errors=0, total=0):
+        with self._lock:
+            self._processed += processed
+            self._hashed += hashed
+            self._bytes += bytes
+            self._errors += errors
+            self._total += total
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = self.clock() - self._started
+            snap = {
+                "total": self._total,
+                "processed": self._processed,
+                "hashed": self._hashed,
+                "bytes": self._bytes,
+                "errors": self._errors,
+                "elapsed": elapsed,
+            }
+        snap["files_per_s"] = snap["processed"] / elapsed if elapsed > 0 else 0.0
+        snap["bytes_per_s"] = snap["bytes"] / elapsed if elapsed > 0 else 0.0
+        return snap
+
+    def add_sink(self, sink):
+        self._sinks.append(sink)
+
+    def remove_sink(self, sink):
+        self._sinks.remove(sink)
+
+    def publish(self):
+        """Push the current snapshot to every sink now."""
+        snap = self.snapshot()
+        for sink in list(self._sinks):
+            try:
+                sink(snap)
+            except Exception:
+                logger.exception("Progress sink %r failed", sink)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.publish()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.publish()
+
+# ---------- Sinks ----------
+
+def format_progress(snap):
+    if snap["total"] > 0:
+        percentage = snap["processed"] / snap["total"] * 100
+        return f"{snap['processed']}/{snap['total']} files processed ({percentage:.2f}%)"
+    return f"{snap['processed']} files processed"
+
+def tray_sink(icon):
+    """Show progress in the system tray tooltip."""
+    def sink(snap):
+        if snap["total"] > 0 or snap["processed"] > 0:
+            icon.title = f"File Hasher: {format_progress(snap)}"
+        else:
+            icon.title = "File Hasher: Initializing..."
+    return sink
+
+def tqdm_sink(bar):
+    """Move a tqdm bar to the current counters."""
+    def sink(snap):
+        bar.total = snap["total"]
+        bar.n = snap["processed"]
+        bar.refresh()
+    return sink
+
+def log_sink(log=logger):
+    def sink(snap):
+        log.info("Progress: %s, %.1f files/s, %.1f MB/s", format_progress(snap),
+                 snap["files_per_s"], snap["bytes_per_s"] / 1e6)
+    return sink
+
+def meta_sink(db_path, key="progress"):
+    """Store the snapshot as JSON in the meta table (read by stats.py)."""
+    def sink(snap):
+        set_meta(db_path, key, json.dumps(snap))
+    return sink
@@ -0,0 +1,85 @@
+from collections import namedtuple
+
+# state: "changed" (stored hash is stale), "new" (never hashed) or "unchanged"
+WorkItem = namedtuple("WorkItem", "path size mtime state")
+
+STATE_RANK = {"changed": 0, "new": 1, "unchanged": 2}
+
+POLICIES = ("changed_first", "recent_first", "small_first", "shortest_expected", "root_weight")
+
+DEFAULT_POLICIES = ("changed_first", "shortest_expected")
+DEFAULT_LARGE_FILE_THRESHOLD = 1024 ** 3  # 1 GiB
+DEFAULT_THROUGHPUT = 50 * 1024 * 1024      # bytes/s until a pass has been measured
+DEFAULT_FILE_OVERHEAD = 0.005              # seconds per file (open, stat, DB write)
+
+class Scheduler:
+    """Order the files of a pass by configurable policies.
+
+    Policies are applied in the order given, each breaking ties of the
+    previous one:
+        changed_first     – files with a stale stored hash, then new files
+        recent_first      – most recently modified first
+        small_first       – smallest first
+        shortest_expected – least expected hashing time (per-file overhead plus
+                            size / observed throughput) divided by the root weight
+        root_weight       – roots with a higher weight first
+
+    Files of at least `large_file_threshold` bytes go to a separate lane so a
+    few huge files cannot hold back everything behind them.
+    """
+
+    def __init__(self, policies=DEFAULT_POLICIES, large_file_threshold=DEFAULT_LARGE_FILE_THRESHOLD,
+                 root_weights=None, throughput=DEFAULT_THROUGHPUT, file_overhead=DEFAULT_FILE_OVERHEAD):
+        unknown = [policy for policy in policies if policy not in POLICIES]
+        if unknown:
+            raise ValueError(f"Unknown scheduling policies: {', '.join(unknown)}")
+        self.policies = tuple(policies)
+        self.large_file_threshold = large_file_threshold
+        self.root_weights = dict(root_weights or {})
+        self.throughput = throughput
+        self.file_overhead = file_overhead
+        # longest root first so nested roots match the most specific one
+        self._roots = sorted(self.root_weights, key=len, reverse=True)
+
+    def root_weight(self, path):
+        for root in self._roots:
+            base = root.rstrip("/\\")
+            if path == root or path[:len(base) + 1] in (base + "/", base + "\\"):
+                return self.root_weights[root]
+        return 1.0
+
+    def expected_seconds(self, item):
+        return self.file_overhead + item.size / max(self.throughput, 1)
+
+    def key(self, item):
+        parts = []
+        for policy in self.policies:
+            if policy == "changed_first":
+                parts.append(STATE_RANK.get(item.state, 1))
+            elif policy == "recent_first":
+                parts.append(-item.mtime)
+            elif policy == "small_first":
+                parts.append(item.size)
+            elif policy == "shortest_expected":
+                parts.append(self.expected_seconds(item) / max(self.root_weight(item.path), 1e-9))
+            elif policy == "root_weight":
+                parts.append(-self.root_weight(item.path))
+        return tuple(parts)
+
+    def plan(self, items):
+        """Split `items` into (regular lane, large lane), each in priority order."""
+        regular, large = [], []
+        for item in items:
+            (large if item.size >= self.large_file_threshold else regular).append(item)
+        regular.sort(key=self.key)
+        large.sort(key=self.key)
+        return regular, large
+
+def make_scheduler(config, throughput=None):
+    """Scheduler configured by SCHEDULE_POLICIES, LARGE_FILE_THRESHOLD and ROOT_WEIGHTS."""
+    return Scheduler(
+        policies=config.get("SCHEDULE_POLICIES") or DEFAULT_POLICIES,
+        large_file_threshold=int(config.get("LARGE_FILE_THRESHOLD") or DEFAULT_LARGE_FILE_THRESHOLD),
+        root_weights=config.get("ROOT_WEIGHTS") or {},
+        throughput=throughput or DEFAULT_THROUGHPUT,
+    )